@@ -1,11 +1,12 @@
 # app/api/__init__.py
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
+from app.api.routes import register_routes
 
-# Crear el router principal y exportarlo
-api_router = APIRouter()
+__all__ = ["api_router"]
 
-# Importar y añadir las rutas
-from app.api.routes import register_routes
+# Crear el router principal y exportarlo (serialización JSON con orjson)
+api_router = APIRouter(default_response_class=ORJSONResponse)
 
 # Registrar todas las rutas
 register_routes(api_router)
\ No newline at end of file
@@ -1,5 +1,7 @@
 #app/api/deps.py
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+import httpx
+from fastapi import Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
 from app.database.database import get_db
 from app.services.openai_service import OpenAIService
@@ -14,31 +16,67 @@ from app.services.pixel_art_mongo import PixelArtMongoService
 from app.services.palette_mongo import PaletteMongoService
 from app.services.user_settings_mongo import UserSettingsMongoService
 
+# Las dependencias se declaran async para que FastAPI las resuelva en el event loop
+# en lugar de enviarlas al threadpool en cada petición.
+# Los servicios no guardan estado por petición, así que se comparte una única instancia;
+# OpenAI y Cloudinary se crean al primer uso para no exigir credenciales al importar.
+_image_processing_service = ImageProcessingService()
+_pixel_art_service = PixelArtService()
+_palette_service = PaletteService()
+_user_settings_service = UserSettingsService()
+_pixel_art_mongo_service = PixelArtMongoService()
+_palette_mongo_service = PaletteMongoService()
+_user_settings_mongo_service = UserSettingsMongoService()
+_openai_service: Optional[OpenAIService] = None
+_cloudinary_service: Optional[CloudinaryService] = None
+
 # Dependencias de servicios anteriores (SQLite)
-def get_openai_service():
-    return OpenAIService()
+async def get_openai_service():
+    global _openai_service
+    if _openai_service is None:
+        _openai_service = OpenAIService()
+    return _openai_service
 
-def get_image_processing_service():
-    return ImageProcessingService()
+async def get_image_processing_service():
+    return _image_processing_service
 
-def get_pixel_art_service():
-    return PixelArtService()
+async def get_pixel_art_service():
+    return _pixel_art_service
 
-def get_palette_service():
-    return PaletteService()
+async def get_palette_service():
+    return _palette_service
 
-def get_user_settings_service():
-    return UserSettingsService()
+async def get_user_settings_service():
+    return _user_settings_service
 
-def get_cloudinary_service():
-    return CloudinaryService()
+async def get_cloudinary_service():
+    global _cloudinary_service
+    if _cloudinary_service is None:
+        _cloudinary_service = CloudinaryService()
+    return _cloudinary_service
 
 # Nuevas dependencias de servicios con MongoDB
-def get_pixel_art_mongo_service():
-    return PixelArtMongoService()
+async def get_pixel_art_mongo_service():
+    return _pixel_art_mongo_service
+
+async def get_palette_mongo_service():
+    return _palette_mongo_service
+
+async def get_user_settings_mongo_service():
+    return _user_settings_mongo_service
 
-def get_palette_mongo_service():
-    return PaletteMongoService()
+# Cliente HTTP asíncrono compartido, creado en el lifespan de la aplicación
+def get_http(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http
 
-def get_user_settings_mongo_service():
-    return UserSettingsMongoService()
\ No newline at end of file
+async def close_services():
+    """
+    Libera los recursos de los servicios compartidos (se llama al apagar la aplicación).
+    """
+    global _openai_service, _cloudinary_service
+    if _openai_service is not None:
+        await _openai_service.aclose()
+        _openai_service = None
+    if _cloudinary_service is not None:
+        _cloudinary_service.close()
+        _cloudinary_service = None
@@ -1,18 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from app.database.database import get_db
-from app.services.migration_service import MigrationService
+from app.database.database import get_db, SessionLocal
+from app.services.migration_service import MigrationService, DEFAULT_BATCH_SIZE
 
 router = APIRouter()
 
 @router.post("/migrate-to-mongodb")
-def migrate_to_mongodb(db: Session = Depends(get_db)):
+async def migrate_to_mongodb(
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db)
+):
     """
     Migra todos los datos desde SQLite a MongoDB.
     Este endpoint es administrativo y debería estar protegido en producción.
     """
     try:
-        result = MigrationService.migrate_all_data(db)
+        result = await MigrationService.migrate_all_data(db, batch_size)
         return {
             "success": True,
             "message": "Migración completada con éxito",
@@ -24,13 +29,42 @@ def migrate_to_mongodb(db: Session = Depends(get_db)):
             detail=f"Error durante la migración: {str(e)}"
         )
 
+async def _migration_progress(batch_size: int):
+    """
+    Ejecuta la migración completa emitiendo una línea NDJSON por cada lote.
+    Usa su propia sesión: las dependencias con yield se cierran antes de
+    que empiece a enviarse la respuesta en streaming.
+    """
+    db = SessionLocal()
+    try:
+        async for event in MigrationService.migrate_all_data_iter(db, batch_size):
+            yield json.dumps(event) + "\n"
+    finally:
+        db.close()
+
+@router.post("/migrate-to-mongodb/stream")
+def migrate_to_mongodb_stream(
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=100000)
+):
+    """
+    Migra todos los datos desde SQLite a MongoDB informando del progreso en
+    streaming (NDJSON), para que la petición no quede bloqueada sin respuesta.
+    """
+    return StreamingResponse(
+        _migration_progress(batch_size),
+        media_type="application/x-ndjson"
+    )
+
 @router.post("/migrate-palettes")
-def migrate_palettes(db: Session = Depends(get_db)):
+async def migrate_palettes(
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db)
+):
     """
     Migra solo las paletas de colores desde SQLite a MongoDB.
     """
     try:
-        count = MigrationService.migrate_palettes(db)
+        count = await MigrationService.migrate_palettes(db, batch_size)
         return {
             "success": True,
             "message": f"Migración de paletas completada: {count} paletas migradas"
@@ -42,12 +76,15 @@ def migrate_palettes(db: Session = Depends(get_db)):
         )
 
 @router.post("/migrate-pixel-arts")
-def migrate_pixel_arts(db: Session = Depends(get_db)):
+async def migrate_pixel_arts(
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db)
+):
     """
     Migra solo los pixel arts desde SQLite a MongoDB.
     """
     try:
-        count = MigrationService.migrate_pixel_arts(db)
+        count = await MigrationService.migrate_pixel_arts(db, batch_size)
         return {
             "success": True,
             "message": f"Migración de pixel arts completada: {count} pixel arts migrados"
@@ -59,12 +96,15 @@ def migrate_pixel_arts(db: Session = Depends(get_db)):
         )
 
 @router.post("/migrate-user-settings")
-def migrate_user_settings(db: Session = Depends(get_db)):
+async def migrate_user_settings(
+    batch_size: int = Query(DEFAULT_BATCH_SIZE, ge=1, le=100000),
+    db: Session = Depends(get_db)
+):
     """
     Migra solo las configuraciones de usuario desde SQLite a MongoDB.
     """
     try:
-        count = MigrationService.migrate_user_settings(db)
+        count = await MigrationService.migrate_user_settings(db, batch_size)
         return {
             "success": True,
             "message": f"Migración de configuraciones de usuario completada: {count} configuraciones migradas"
@@ -1,39 +1,128 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import threading
+from typing import List, Optional
+import orjson
+from cachetools import TTLCache
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database.database import get_db
-from app.models.pixel_art import ColorPalette, PaletteList
+from app.database.database import get_db, get_async_db
+from app.models.pixel_art import ColorPalette, PaletteList, PaletteUpdate
 from app.services.palette import PaletteService
 from app.api.deps import get_palette_service
 
 router = APIRouter()
 
+# Caché en memoria para las paletas: son datos de referencia que casi nunca cambian
+PALETTE_CACHE_TTL = 300
+_PALETTE_CACHE = TTLCache(maxsize=512, ttl=PALETTE_CACHE_TTL)
+# Las rutas síncronas (en el threadpool) y las asíncronas comparten la caché: acceso con lock
+_PALETTE_CACHE_LOCK = threading.Lock()
+# Clave para la lista completa (un objeto para que no choque con ningún ID de paleta)
+_ALL_KEY = object()
+# Los clientes pueden guardar la respuesta pero deben revalidarla (ETag/304) en cada uso:
+# con max-age seguirían viendo una paleta modificada o borrada hasta que caducara
+_CACHE_CONTROL = "no-cache"
+
+def _etag(body: bytes) -> str:
+    """
+    ETag débil a partir del hash del JSON: las marcas de tiempo de SQLite tienen resolución
+    de segundos y dos cambios en el mismo segundo compartirían versión.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+def _invalidate_palette(palette_id: str):
+    """
+    Elimina de la caché una paleta, sus colores y la lista completa de paletas.
+    """
+    with _PALETTE_CACHE_LOCK:
+        _PALETTE_CACHE.pop(palette_id, None)
+        _PALETTE_CACHE.pop(("colors", palette_id), None)
+        _PALETTE_CACHE.pop(_ALL_KEY, None)
+
+async def get_cached_palette_colors(db: AsyncSession, palette_id: str) -> Optional[List[str]]:
+    """
+    Devuelve los colores de una paleta usando la caché compartida con las rutas de lectura.
+    Solo se guarda la lista de colores, que es lo único que necesita el procesamiento.
+    
+    Returns:
+        Lista de colores hexadecimales o None si la paleta no existe
+    """
+    key = ("colors", palette_id)
+    with _PALETTE_CACHE_LOCK:
+        colors = _PALETTE_CACHE.get(key)
+    if colors is None:
+        palette = await PaletteService.get_palette_by_id_async(db, palette_id)
+        if not palette:
+            return None
+        colors = list(palette.colors)
+        with _PALETTE_CACHE_LOCK:
+            _PALETTE_CACHE[key] = colors
+    return colors
+
 # Obtener todas las paletas
 @router.get("/", response_model=PaletteList)
-def get_palettes(
-    db: Session = Depends(get_db),
+async def get_palettes(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     palette_service: PaletteService = Depends(get_palette_service)
 ):
     """
     Obtiene todas las paletas de colores disponibles.
+    Devuelve 304 si el cliente ya tiene la versión actual (If-None-Match).
     """
-    palettes = palette_service.get_palettes(db)
-    return {"palettes": palettes}
+    with _PALETTE_CACHE_LOCK:
+        cached = _PALETTE_CACHE.get(_ALL_KEY)
+    if cached is None:
+        palettes = await palette_service.get_palettes_async(db)
+        # Guardar el JSON ya codificado y no los objetos ORM (evita sesiones desconectadas
+        # y volver a serializar la lista en cada petición)
+        body = orjson.dumps({
+            "palettes": [
+                ColorPalette.model_validate(palette, from_attributes=True).model_dump()
+                for palette in palettes
+            ]
+        })
+        cached = (body, _etag(body))
+        with _PALETTE_CACHE_LOCK:
+            _PALETTE_CACHE[_ALL_KEY] = cached
+    
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # Obtener una paleta específica
 @router.get("/{palette_id}", response_model=ColorPalette)
-def get_palette(
+async def get_palette(
     palette_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     palette_service: PaletteService = Depends(get_palette_service)
 ):
     """
     Obtiene una paleta específica por su ID.
+    Devuelve 304 si el cliente ya tiene la versión actual (If-None-Match).
     """
-    palette = palette_service.get_palette_by_id(db, palette_id)
-    if not palette:
-        raise HTTPException(status_code=404, detail="Palette not found")
-    return palette
+    with _PALETTE_CACHE_LOCK:
+        cached = _PALETTE_CACHE.get(palette_id)
+    if cached is None:
+        palette = await palette_service.get_palette_by_id_async(db, palette_id)
+        if not palette:
+            raise HTTPException(status_code=404, detail="Palette not found")
+        body = orjson.dumps(ColorPalette.model_validate(palette, from_attributes=True).model_dump())
+        cached = (body, _etag(body))
+        with _PALETTE_CACHE_LOCK:
+            _PALETTE_CACHE[palette_id] = cached
+    
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 # Crear una nueva paleta
 @router.post("/", response_model=ColorPalette)
@@ -47,6 +136,7 @@ def create_palette(
     """
     try:
         db_palette = palette_service.create_palette(db, palette.id, palette.name, palette.colors)
+        _invalidate_palette(palette.id)
         return db_palette
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -55,16 +145,19 @@ def create_palette(
 @router.put("/{palette_id}", response_model=ColorPalette)
 def update_palette(
     palette_id: str,
-    palette_update: dict,
+    palette_update: PaletteUpdate,
     db: Session = Depends(get_db),
     palette_service: PaletteService = Depends(get_palette_service)
 ):
     """
     Actualiza una paleta existente.
     """
-    updated_palette = palette_service.update_palette(db, palette_id, palette_update)
+    updated_palette = palette_service.update_palette(
+        db, palette_id, palette_update.model_dump(exclude_unset=True)
+    )
     if not updated_palette:
         raise HTTPException(status_code=404, detail="Palette not found")
+    _invalidate_palette(palette_id)
     return updated_palette
 
 # Eliminar una paleta
@@ -81,6 +174,7 @@ def delete_palette(
         success = palette_service.delete_palette(db, palette_id)
         if not success:
             raise HTTPException(status_code=404, detail="Palette not found")
+        _invalidate_palette(palette_id)
         return {"message": "Palette deleted successfully"}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
\ No newline at end of file
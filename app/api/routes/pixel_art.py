@@ -1,83 +1,108 @@
 #app/api/routes/pixel_art.py
 import os
-import uuid
-import shutil
-from typing import List
-from venv import logger
-from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, Query, Request
+import re
+import logging
+import asyncio
+import hashlib
+from typing import List, Optional
+import orjson
+from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from app.database.database import get_db
+from app.database.database import get_db, get_async_db
 from app.models.pixel_art import (
     PixelArt, PixelArtCreate, PixelArtList, 
-    PixelArtPromptRequest, PixelArtProcessSettings
+    PixelArtPromptRequest, PixelArtProcessSettings, PixelArtUpdate
 )
 from app.services.pixel_art import PixelArtService
 from app.services.openai_service import OpenAIService
 from app.services.image_processing import ImageProcessingService
-from app.services.palette import PaletteService
 from app.services.cloudinary_service import CloudinaryService
 from app.api.deps import (
     get_pixel_art_service, 
     get_openai_service, 
     get_image_processing_service,
-    get_palette_service,
     get_cloudinary_service
 )
+from app.api.routes.palettes import get_cached_palette_colors
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Formatos de imagen admitidos en las subidas (y mensaje de error precalculado)
+_VALID_EXTS = frozenset({".jpg", ".jpeg", ".png", ".webp"})
+_INVALID_FORMAT_DETAIL = "Invalid file format. Supported formats: .jpg, .jpeg, .png, .webp"
+
+# Separador de etiquetas: coma con espacios opcionales alrededor
+_TAG_RE = re.compile(r"\s*,\s*")
+
 # Obtener todos los pixel arts
 @router.get("/", response_model=PixelArtList)
-def get_pixel_arts(
+async def get_pixel_arts(
     skip: int = 0, 
     limit: int = 100,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     pixel_art_service: PixelArtService = Depends(get_pixel_art_service)
 ):
     """
-    Obtiene una lista de todos los pixel arts.
+    Obtiene una página de pixel arts junto con el total para paginar.
     """
-    pixel_arts = pixel_art_service.get_pixel_arts(db, skip=skip, limit=limit)
-    return {"items": pixel_arts, "total": len(pixel_arts)}
+    # La sesión asíncrona no admite consultas concurrentes, se ejecutan en secuencia
+    pixel_arts = await pixel_art_service.get_pixel_arts_async(db, skip=skip, limit=limit)
+    total = await pixel_art_service.count_pixel_arts_async(db)
+    return {"items": pixel_arts, "total": total, "skip": skip, "limit": limit}
 
 # Obtener un pixel art específico
 @router.get("/{pixel_art_id}", response_model=PixelArt)
-def get_pixel_art(
+async def get_pixel_art(
     pixel_art_id: str,
-    db: Session = Depends(get_db),
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
     pixel_art_service: PixelArtService = Depends(get_pixel_art_service)
 ):
     """
     Obtiene un pixel art específico por su ID.
+    Devuelve 304 si el cliente ya tiene la versión actual (If-None-Match).
     """
-    pixel_art = pixel_art_service.get_pixel_art_by_id(db, pixel_art_id)
+    pixel_art = await pixel_art_service.get_pixel_art_by_id_async(db, pixel_art_id)
     if not pixel_art:
         raise HTTPException(status_code=404, detail="Pixel art not found")
-    return pixel_art
+    
+    # ETag débil a partir del hash del cuerpo: las marcas de tiempo de SQLite tienen
+    # resolución de segundos y dos cambios en el mismo segundo compartirían versión
+    body = orjson.dumps(PixelArt.model_validate(pixel_art, from_attributes=True).model_dump())
+    etag = f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
 
 # Crear un nuevo pixel art desde un prompt
 @router.post("/generate-from-prompt", response_model=PixelArt)
 async def generate_from_prompt(
     request: PixelArtPromptRequest,
     db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db),
     openai_service: OpenAIService = Depends(get_openai_service),
     pixel_art_service: PixelArtService = Depends(get_pixel_art_service),
-    palette_service: PaletteService = Depends(get_palette_service),
     cloudinary_service: CloudinaryService = Depends(get_cloudinary_service)
 ):
     """
     Genera un nuevo pixel art a partir de un prompt utilizando IA.
     """
-    # Obtener la paleta
-    palette = palette_service.get_palette_by_id(db, request.settings.paletteId)
-    print(palette)
-    print(request.settings)
-    if not palette:
-        raise HTTPException(status_code=404, detail=f"Palette with id {request.settings.paletteId} not found")
+    # Obtener los colores de la paleta (en caché) y generar la imagen con OpenAI en paralelo
+    palette_colors, image_data = await asyncio.gather(
+        get_cached_palette_colors(async_db, request.settings.paletteId),
+        openai_service.generate_from_prompt(request.prompt, request.settings)
+    )
     
-    # Generar la imagen con OpenAI
-    image_data = openai_service.generate_from_prompt(request.prompt, request.settings)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("palette_colors=%r settings=%r", palette_colors, request.settings)
+    
+    if palette_colors is None:
+        raise HTTPException(status_code=404, detail=f"Palette with id {request.settings.paletteId} not found")
     
     if not image_data:
         raise HTTPException(status_code=500, detail="Failed to generate image from prompt")
@@ -94,7 +119,9 @@ async def generate_from_prompt(
     )
     
     # Crear el registro en la base de datos con soporte para Cloudinary
-    pixel_art = pixel_art_service.create_pixel_art(
+    # (en un hilo: la subida a Cloudinary y la sesión síncrona bloquean)
+    pixel_art = await asyncio.to_thread(
+        pixel_art_service.create_pixel_art,
         db, 
         pixel_art_data, 
         image_data, 
@@ -115,44 +142,34 @@ async def process_image(
     sharpness: int = Form(70),
     backgroundType: str = Form("transparent"),
     animationType: str = Form("none"),
+    prompt: Optional[str] = Form(None),  # Prompt opcional
     tags: str = Form(""),
     db: Session = Depends(get_db),
+    async_db: AsyncSession = Depends(get_async_db),
     image_processing_service: ImageProcessingService = Depends(get_image_processing_service),
     pixel_art_service: PixelArtService = Depends(get_pixel_art_service),
-    palette_service: PaletteService = Depends(get_palette_service),
+    openai_service: OpenAIService = Depends(get_openai_service),
     cloudinary_service: CloudinaryService = Depends(get_cloudinary_service)
 ):
     """
     Procesa una imagen subida para convertirla en pixel art.
+    Si se proporciona un prompt, se utilizará para mejorar o modificar la imagen con IA.
     """
     # Validar el formato de la imagen
-    valid_formats = [".jpg", ".jpeg", ".png", ".webp"]
     file_ext = os.path.splitext(file.filename or "unknown.png")[1].lower()
     
-    if file_ext not in valid_formats:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid file format. Supported formats: {', '.join(valid_formats)}"
-        )
-    
-    # Ensure upload folder exists
-    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    if file_ext not in _VALID_EXTS:
+        raise HTTPException(status_code=400, detail=_INVALID_FORMAT_DETAIL)
     
-    # Guardar la imagen subida temporalmente
-    temp_filename = f"{uuid.uuid4()}{file_ext}"
-    temp_file_path = os.path.join(settings.UPLOAD_FOLDER, temp_filename)
+    # Leer la imagen subida en memoria (sin archivo temporal), limitando su tamaño
+    image_bytes = await file.read(settings.MAX_UPLOAD_BYTES + 1)
+    if len(image_bytes) > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
     
     try:
-        # Log what we're doing
-        logger.info(f"Saving uploaded file to: {temp_file_path}")
-        
-        # Guardar el archivo
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Obtener la paleta
-        palette = palette_service.get_palette_by_id(db, paletteId)
-        if not palette:
+        # Obtener los colores de la paleta (en caché)
+        palette_colors = await get_cached_palette_colors(async_db, paletteId)
+        if palette_colors is None:
             raise HTTPException(status_code=404, detail=f"Palette with id {paletteId} not found")
         
         # Crear settings para el procesamiento
@@ -166,32 +183,34 @@ async def process_image(
             animationType=animationType
         )
         
-        logger.info(f"Created process settings: {process_settings}")
+        logger.info("Created process settings: %s", process_settings)
         
-        # Procesar la imagen
-        processed_image_data = image_processing_service.process_image(
-            temp_file_path, 
-            process_settings,
-            palette.colors
-        )
+        # Con prompt se procesa con OpenAI; sin prompt (o si OpenAI falla), localmente
+        image_data = None
+        if prompt:
+            logger.info(f"Processing image with prompt: {prompt}")
+            image_data = await openai_service.process_image(
+                image_bytes,
+                process_settings,
+                palette_colors,
+                prompt
+            )
+            if not image_data:
+                logger.warning("OpenAI processing failed, falling back to basic processing")
+        
+        if not image_data:
+            image_data = await image_processing_service.process_image_bytes_async(
+                image_bytes, 
+                process_settings,
+                palette_colors
+            )
         
-        if not processed_image_data:
+        if not image_data:
             logger.error("Failed to process image: No data returned from image processing service")
             raise HTTPException(status_code=500, detail="Failed to process image")
         
-        # Si estamos usando OpenAI para procesamiento avanzado
-        openai_service = OpenAIService()
-        advanced_processed = await openai_service.process_image(
-            temp_file_path,
-            process_settings,
-            palette.colors
-        )
-        
-        # Usar el resultado de OpenAI si está disponible, sino usar el procesamiento local
-        image_data = advanced_processed if advanced_processed else processed_image_data
-        
         # Preparar datos para crear el pixel art
-        tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
+        tag_list = [tag for tag in _TAG_RE.split(tags.strip()) if tag]
         pixel_art_data = PixelArtCreate(
             name=name,
             pixelSize=pixelSize,
@@ -203,7 +222,9 @@ async def process_image(
         )
         
         # Crear el registro en la base de datos con soporte para Cloudinary
-        pixel_art = pixel_art_service.create_pixel_art(
+        # (en un hilo: la subida a Cloudinary y la sesión síncrona bloquean)
+        pixel_art = await asyncio.to_thread(
+            pixel_art_service.create_pixel_art,
             db, 
             pixel_art_data, 
             image_data, 
@@ -211,38 +232,31 @@ async def process_image(
         )
         
         return pixel_art
+    
+    except HTTPException:
+        raise
         
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         
-        # Asegurar que limpiamos el archivo temporal en caso de error
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
-    
-    finally:
-        # Limpiar el archivo temporal
-        if os.path.exists(temp_file_path):
-            try:
-                os.remove(temp_file_path)
-            except Exception as e:
-                logger.error(f"Error removing temporary file: {str(e)}")
 
 # Actualizar un pixel art
 @router.put("/{pixel_art_id}", response_model=PixelArt)
 def update_pixel_art(
     pixel_art_id: str,
-    pixel_art_update: dict,
+    pixel_art_update: PixelArtUpdate,
     db: Session = Depends(get_db),
     pixel_art_service: PixelArtService = Depends(get_pixel_art_service)
 ):
     """
     Actualiza un pixel art existente.
     """
-    updated_pixel_art = pixel_art_service.update_pixel_art(db, pixel_art_id, pixel_art_update)
+    updated_pixel_art = pixel_art_service.update_pixel_art(
+        db, pixel_art_id, pixel_art_update.model_dump(exclude_unset=True)
+    )
     if not updated_pixel_art:
         raise HTTPException(status_code=404, detail="Pixel art not found")
     return updated_pixel_art
@@ -272,7 +286,7 @@ async def test_prompt(request: dict):
     """
     Endpoint de prueba para verificar que los prompts llegan correctamente.
     """
-    print("Solicitud de prueba recibida:", request)
+    logger.debug("Solicitud de prueba recibida: %r", request)
     return {
         "status": "success", 
         "message": "Test exitoso", 
@@ -1,15 +1,22 @@
 #app/api/routes/pixel_art_mongo.py
 import os
-import uuid
+import re
+import hashlib
+import logging
+import asyncio
 import httpx
-import shutil
-from datetime import datetime
-from typing import List, Optional, Dict
-from venv import logger
+import aiofiles
+import aiofiles.tempfile
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Tuple
+from urllib.parse import urlsplit
 from fastapi import APIRouter, Depends, File, Form, UploadFile, HTTPException, Query, Request, Body
+from fastapi.responses import FileResponse, RedirectResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from starlette.background import BackgroundTask
 from app.models.pixel_art import (
     PixelArt, PixelArtCreate, PixelArtList, 
-    PixelArtPromptRequest, PixelArtProcessSettings
+    PixelArtPromptRequest, PixelArtProcessSettings, PixelArtUpdate
 )
 from app.services.pixel_art_mongo import PixelArtMongoService
 from app.services.openai_service import OpenAIService
@@ -21,39 +28,162 @@ from app.api.deps import (
     get_image_processing_service,
     get_cloudinary_service,
     get_pixel_art_mongo_service,
-    get_palette_mongo_service
+    get_palette_mongo_service,
+    get_http
 )
 from app.config import settings
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter()
 
+# Formatos de imagen admitidos en las subidas (y mensaje de error precalculado)
+_VALID_EXTS = frozenset({".jpg", ".jpeg", ".png", ".webp"})
+_INVALID_FORMAT_DETAIL = "Invalid file format. Supported formats: .jpg, .jpeg, .png, .webp"
+
+# Separador de etiquetas: coma con espacios opcionales alrededor
+_TAG_RE = re.compile(r"\s*,\s*")
+
+# Tamaño de bloque para copiar las subidas a disco (64 KB)
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+async def _load_upload(file: UploadFile, file_ext: str) -> Tuple[Optional[bytes], Optional[str], str]:
+    """
+    Lee el archivo subido. Las imágenes pequeñas se quedan en memoria; las que superan
+    IN_MEMORY_MAX_BYTES se vuelcan por bloques a un archivo temporal, respetando el
+    tamaño máximo permitido. Calcula a la vez el SHA-256 del contenido.
+    
+    Returns:
+        Tupla (bytes, None, sha256) si la imagen cabe en memoria o (None, ruta_temporal, sha256) si no
+    """
+    data = await file.read(settings.IN_MEMORY_MAX_BYTES + 1)
+    if len(data) > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Uploaded file is too large")
+    digest = hashlib.sha256(data)
+    if len(data) <= settings.IN_MEMORY_MAX_BYTES:
+        return data, None, digest.hexdigest()
+    
+    async with aiofiles.tempfile.NamedTemporaryFile(
+        "wb", dir=settings.UPLOAD_FOLDER, suffix=file_ext, delete=False
+    ) as buffer:
+        temp_file_path = buffer.name
+        try:
+            bytes_written = len(data)
+            await buffer.write(data)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                bytes_written += len(chunk)
+                if bytes_written > settings.MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail="Uploaded file is too large")
+                digest.update(chunk)
+                await buffer.write(chunk)
+        except Exception:
+            os.remove(temp_file_path)
+            raise
+    
+    return None, temp_file_path, digest.hexdigest()
+
+def _allowed_updates(pixel_art_update: Dict) -> Dict:
+    """
+    Deja solo los campos actualizables de PixelArtUpdate (validados): el resto del cuerpo
+    (imageUrl, id, cloudinaryPublicId...) nunca llega al $set de MongoDB.
+    """
+    fields = {key: value for key, value in pixel_art_update.items() if key in PixelArtUpdate.model_fields}
+    try:
+        return PixelArtUpdate.model_validate(fields).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+class _ImageAdjustments(BaseModel):
+    """Ajustes de imagen que acompañan a una actualización con cambios en la imagen."""
+    contrast: int = Field(50, ge=0, le=100)
+    sharpness: int = Field(70, ge=0, le=100)
+
+def _image_adjustments(pixel_art_update: Dict) -> _ImageAdjustments:
+    """
+    Valida contrast y sharpness del cuerpo de la actualización (422 si no son válidos).
+    """
+    fields = {key: pixel_art_update[key] for key in ("contrast", "sharpness") if key in pixel_art_update}
+    try:
+        return _ImageAdjustments.model_validate(fields)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+def _processed_cache_key(image_sha256: str, process_settings: PixelArtProcessSettings, prompt: Optional[str], palette_colors: List[str]) -> str:
+    """
+    Clave de la caché de subidas: misma imagen, mismos ajustes, mismo prompt y mismos colores
+    de paleta (si se edita la paleta, la clave cambia y no se sirven imágenes con los antiguos).
+    """
+    raw = f"{image_sha256}:{process_settings.model_dump_json()}:{prompt or ''}:{','.join(palette_colors)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
 # Obtener todos los pixel arts
 @router.get("/", response_model=PixelArtList)
-def get_pixel_arts(
+async def get_pixel_arts(
     skip: int = 0, 
     limit: int = 100,
     pixel_art_service: PixelArtMongoService = Depends(get_pixel_art_mongo_service)
 ):
     """
-    Obtiene una lista de todos los pixel arts.
+    Obtiene una página de pixel arts junto con el total para paginar.
     """
-    result = pixel_art_service.get_pixel_arts(skip=skip, limit=limit)
-    return {"items": result, "total": len(result)}
+    items, total = await asyncio.gather(
+        pixel_art_service.get_pixel_arts(skip=skip, limit=limit),
+        pixel_art_service.count_pixel_arts()
+    )
+    return {"items": items, "total": total, "skip": skip, "limit": limit}
 
 # Obtener un pixel art específico
 @router.get("/{pixel_art_id}", response_model=PixelArt)
-def get_pixel_art(
+async def get_pixel_art(
     pixel_art_id: str,
     pixel_art_service: PixelArtMongoService = Depends(get_pixel_art_mongo_service)
 ):
     """
     Obtiene un pixel art específico por su ID.
     """
-    pixel_art = pixel_art_service.get_pixel_art_by_id(pixel_art_id)
+    pixel_art = await pixel_art_service.get_pixel_art_by_id(pixel_art_id)
     if not pixel_art:
         raise HTTPException(status_code=404, detail="Pixel art not found")
     return pixel_art
 
+# Servir la imagen de un pixel art
+@router.get("/{pixel_art_id}/image")
+async def get_pixel_art_image(
+    pixel_art_id: str,
+    pixel_art_service: PixelArtMongoService = Depends(get_pixel_art_mongo_service),
+    http_client: httpx.AsyncClient = Depends(get_http)
+):
+    """
+    Devuelve la imagen de un pixel art sin cargarla entera en memoria: los archivos locales
+    se envían con FileResponse y las imágenes remotas (Cloudinary) se retransmiten por bloques.
+    Solo se retransmiten los hosts de IMAGE_PROXY_ALLOWED_HOSTS; para cualquier otra URL se
+    redirige al cliente (la API no hace peticiones a direcciones arbitrarias).
+    """
+    pixel_art = await pixel_art_service.get_pixel_art_by_id(pixel_art_id)
+    if not pixel_art:
+        raise HTTPException(status_code=404, detail="Pixel art not found")
+    
+    image_url = pixel_art.get("imageUrl", "")
+    if not image_url.startswith(("http://", "https://")):
+        local_image_path = os.path.join(settings.RESULTS_FOLDER, os.path.basename(image_url))
+        if not os.path.exists(local_image_path):
+            raise HTTPException(status_code=404, detail="Image file not found")
+        return FileResponse(local_image_path)
+    
+    parts = urlsplit(image_url)
+    if parts.scheme != "https" or parts.hostname not in settings.IMAGE_PROXY_ALLOWED_HOSTS:
+        return RedirectResponse(image_url, status_code=302)
+    
+    upstream = await http_client.send(http_client.build_request("GET", image_url), stream=True)
+    if upstream.status_code != 200:
+        await upstream.aclose()
+        raise HTTPException(status_code=502, detail="Error fetching image from storage")
+    
+    return StreamingResponse(
+        upstream.aiter_bytes(),
+        media_type=upstream.headers.get("content-type", "image/png"),
+        background=BackgroundTask(upstream.aclose)
+    )
 
 # Crear un nuevo pixel art desde un prompt
 @router.post("/generate-from-prompt", response_model=PixelArt)
@@ -68,12 +198,12 @@ async def generate_from_prompt(
     Genera un nuevo pixel art a partir de un prompt utilizando IA.
     """
     # Obtener la paleta
-    palette = palette_service.get_palette_by_id(request.settings.paletteId)
+    palette = await palette_service.get_palette_by_id(request.settings.paletteId)
     if not palette:
         raise HTTPException(status_code=404, detail=f"Palette with id {request.settings.paletteId} not found")
     
     # Generar la imagen con OpenAI
-    image_data = openai_service.generate_from_prompt(request.prompt, request.settings)
+    image_data = await openai_service.generate_from_prompt(request.prompt, request.settings)
     
     if not image_data:
         raise HTTPException(status_code=500, detail="Failed to generate image from prompt")
@@ -90,7 +220,7 @@ async def generate_from_prompt(
     )
     
     # Crear el registro en la base de datos con soporte para Cloudinary
-    pixel_art = pixel_art_service.create_pixel_art(
+    pixel_art = await pixel_art_service.create_pixel_art(
         pixel_art_data, 
         image_data, 
         cloudinary_service if settings.USE_CLOUDINARY else None
@@ -123,32 +253,26 @@ async def process_image(
     Si se proporciona un prompt, se utilizará para mejorar o modificar la imagen con IA.
     """
     # Validar el formato de la imagen
-    valid_formats = [".jpg", ".jpeg", ".png", ".webp"]
     file_ext = os.path.splitext(file.filename or "unknown.png")[1].lower()
     
-    if file_ext not in valid_formats:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"Invalid file format. Supported formats: {', '.join(valid_formats)}"
-        )
-    
-    # Ensure upload folder exists
-    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    if file_ext not in _VALID_EXTS:
+        raise HTTPException(status_code=400, detail=_INVALID_FORMAT_DETAIL)
     
-    # Guardar la imagen subida temporalmente
-    temp_filename = f"{uuid.uuid4()}{file_ext}"
-    temp_file_path = os.path.join(settings.UPLOAD_FOLDER, temp_filename)
+    temp_file_path = None
     
     try:
-        # Log what we're doing
-        logger.info(f"Saving uploaded file to: {temp_file_path}")
-        
-        # Guardar el archivo
-        with open(temp_file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        # Obtener la paleta
-        palette = palette_service.get_palette_by_id(paletteId)
+        # Leer la subida (en memoria o a un temporal si es grande) y obtener la paleta a la vez;
+        # se esperan ambas aunque una falle para conocer el temporal y poder borrarlo
+        upload, palette = await asyncio.gather(
+            _load_upload(file, file_ext),
+            palette_service.get_palette_by_id(paletteId),
+            return_exceptions=True
+        )
+        if not isinstance(upload, BaseException):
+            image_bytes, temp_file_path, image_sha256 = upload
+        for result in (upload, palette):
+            if isinstance(result, BaseException):
+                raise result
         if not palette:
             raise HTTPException(status_code=404, detail=f"Palette with id {paletteId} not found")
         
@@ -163,16 +287,34 @@ async def process_image(
             animationType=animationType
         )
         
-        logger.info(f"Created process settings: {process_settings}")
+        logger.info("Created process settings: %s", process_settings)
         
-        # Determinar flujo de procesamiento basado en la presencia del prompt
-        final_image_data = None
+        # Procesamiento básico desde memoria o desde el archivo temporal
+        async def process_locally():
+            if image_bytes is not None:
+                return await image_processing_service.process_image_bytes_async(
+                    image_bytes, process_settings, palette["colors"]
+                )
+            return await image_processing_service.process_image_async(
+                temp_file_path, process_settings, palette["colors"]
+            )
+        
+        # Si ya se procesó una subida idéntica (misma imagen, ajustes y prompt), reutilizar
+        # su imagen sin pasar por OpenAI, el procesamiento local ni Cloudinary
+        cache_key = _processed_cache_key(image_sha256, process_settings, prompt, palette["colors"])
+        final_image_data = await pixel_art_service.get_processed_image(cache_key)
+        cache_hit = final_image_data is not None
+        # Un resultado de respaldo (OpenAI falló) no se guarda en caché para el prompt
+        cacheable = True
         
-        if prompt:
+        # Determinar flujo de procesamiento basado en la presencia del prompt
+        if cache_hit:
+            logger.info(f"Reusing processed image for identical upload ({image_sha256[:12]})")
+        elif prompt:
             # Si hay un prompt, procesamos directamente con OpenAI usando la función mejorada
             logger.info(f"Processing image with prompt: {prompt}")
             final_image_data = await openai_service.process_image(
-                temp_file_path,  # Ruta de la imagen original
+                image_bytes if image_bytes is not None else temp_file_path,  # Imagen original
                 process_settings,
                 palette["colors"],
                 prompt  # Pasamos el prompt a la función mejorada
@@ -181,26 +323,19 @@ async def process_image(
             if not final_image_data:
                 logger.warning("OpenAI processing failed, falling back to basic processing")
                 # Si falla OpenAI, usamos el procesamiento básico
-                final_image_data = image_processing_service.process_image(
-                    temp_file_path, 
-                    process_settings,
-                    palette["colors"]
-                )
+                final_image_data = await process_locally()
+                cacheable = False
         else:
             # Sin prompt, usamos el procesamiento básico
             logger.info("Processing image without prompt")
-            final_image_data = image_processing_service.process_image(
-                temp_file_path, 
-                process_settings,
-                palette["colors"]
-            )
+            final_image_data = await process_locally()
         
         if not final_image_data:
             logger.error("Failed to process image: No data returned from processing")
             raise HTTPException(status_code=500, detail="Failed to process image")
         
         # Preparar datos para crear el pixel art
-        tag_list = [tag.strip() for tag in tags.split(",")] if tags else []
+        tag_list = [tag for tag in _TAG_RE.split(tags.strip()) if tag]
         pixel_art_data = PixelArtCreate(
             name=name,
             pixelSize=pixelSize,
@@ -208,49 +343,40 @@ async def process_image(
             backgroundType=backgroundType,
             paletteId=paletteId,
             animationType=animationType,
-            tags=tag_list
+            tags=tag_list,
+            prompt=prompt,
+            versionHistory=[]
         )
         
-        # Crear el registro en la base de datos con soporte para Cloudinary
-        pixel_art = pixel_art_service.create_pixel_art(
+        # Crear el registro (con el prompt incluido) en la base de datos con soporte para Cloudinary
+        pixel_art = await pixel_art_service.create_pixel_art(
             pixel_art_data, 
             final_image_data, 
             cloudinary_service if settings.USE_CLOUDINARY else None
         )
         
-        # Añadir el prompt al registro si existe
-        if prompt:
-            # Guardar el prompt directamente en el pixel art en lugar de hacerlo en dos pasos
-            update_data = {
-                "prompt": prompt
-            }
-            
-            # Inicializar el historial de versiones vacío si no existe
-            if "versionHistory" not in pixel_art or not pixel_art["versionHistory"]:
-                update_data["versionHistory"] = []
-            
-            # Actualizar el pixel art con el prompt
-            updated_pixel_art = pixel_art_service.update_pixel_art(pixel_art["id"], update_data)
-            if updated_pixel_art:
-                pixel_art = updated_pixel_art
-                logger.info(f"Added prompt and initialized version history for pixel art {pixel_art['id']}")
+        # Recordar el resultado para futuras subidas idénticas
+        if not cache_hit and cacheable:
+            try:
+                await pixel_art_service.save_processed_image(cache_key, pixel_art)
+            except Exception as e:
+                logger.warning(f"Could not cache processed image: {str(e)}")
 
         return pixel_art
+    
+    except HTTPException:
+        raise
         
     except Exception as e:
         logger.error(f"Error processing image: {str(e)}")
         import traceback
         logger.error(traceback.format_exc())
         
-        # Asegurar que limpiamos el archivo temporal en caso de error
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-        
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
     
     finally:
-        # Limpiar el archivo temporal
-        if os.path.exists(temp_file_path):
+        # Limpiar el archivo temporal (solo existe para subidas grandes)
+        if temp_file_path and os.path.exists(temp_file_path):
             try:
                 os.remove(temp_file_path)
             except Exception as e:
@@ -276,13 +402,16 @@ async def update_pixel_art(
     aplicando las modificaciones solicitadas usando OpenAI.
     """
     # Verificar que el pixel art existe
-    existing_pixel_art = pixel_art_service.get_pixel_art_by_id(pixel_art_id)
+    existing_pixel_art = await pixel_art_service.get_pixel_art_by_id(pixel_art_id)
     if not existing_pixel_art:
         raise HTTPException(status_code=404, detail="Pixel art not found")
     
+    # Solo los campos actualizables del modelo llegan a la base de datos
+    updates = _allowed_updates(pixel_art_update)
+    
     # Si no se solicita aplicar cambios a la imagen, simplemente actualizar los metadatos
     if not apply_changes_to_image:
-        updated_pixel_art = pixel_art_service.update_pixel_art(pixel_art_id, pixel_art_update)
+        updated_pixel_art = await pixel_art_service.update_pixel_art(pixel_art_id, updates)
         return updated_pixel_art
     
     # Si se solicita aplicar cambios a la imagen, procesar con OpenAI
@@ -292,45 +421,35 @@ async def update_pixel_art(
             detail="Se requiere un prompt para aplicar cambios a la imagen"
         )
     
+    adjustments = _image_adjustments(pixel_art_update)
+    
     # Obtener la paleta
-    palette_id = pixel_art_update.get("paletteId", existing_pixel_art.get("paletteId"))
-    palette = palette_service.get_palette_by_id(palette_id)
+    palette_id = updates.get("paletteId", existing_pixel_art.get("paletteId"))
+    palette = await palette_service.get_palette_by_id(palette_id)
     if not palette:
         raise HTTPException(status_code=404, detail=f"Palette with id {palette_id} not found")
     
     # Crear configuración de procesamiento
-    process_settings = PixelArtProcessSettings(
-        pixelSize=pixel_art_update.get("pixelSize", existing_pixel_art.get("pixelSize", 8)),
-        style=pixel_art_update.get("style", existing_pixel_art.get("style", "retro")),
-        paletteId=palette_id,
-        contrast=pixel_art_update.get("contrast", 50),
-        sharpness=pixel_art_update.get("sharpness", 70),
-        backgroundType=pixel_art_update.get("backgroundType", existing_pixel_art.get("backgroundType", "transparent")),
-        animationType=pixel_art_update.get("animationType", existing_pixel_art.get("animationType", "none"))
-    )
+    try:
+        process_settings = PixelArtProcessSettings(
+            pixelSize=updates.get("pixelSize", existing_pixel_art.get("pixelSize", 8)),
+            style=updates.get("style", existing_pixel_art.get("style", "retro")),
+            paletteId=palette_id,
+            contrast=adjustments.contrast,
+            sharpness=adjustments.sharpness,
+            backgroundType=updates.get("backgroundType", existing_pixel_art.get("backgroundType", "transparent")),
+            animationType=updates.get("animationType", existing_pixel_art.get("animationType", "none"))
+        )
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
     
     # Construir la ruta de la imagen actual
     image_url = existing_pixel_art.get("imageUrl", "")
     local_image_path = None
     
-    # Si la imagen está en Cloudinary o es una URL externa, descargarla primero
-    if image_url.startswith(("http://", "https://")):
-        try:
-            # Descargar la imagen de Cloudinary
-            local_image_path = os.path.join(
-                settings.UPLOAD_FOLDER, 
-                f"temp_{uuid.uuid4()}.png"
-            )
-            response = httpx.get(image_url)
-            with open(local_image_path, "wb") as f:
-                f.write(response.content)
-        except Exception as e:
-            raise HTTPException(
-                status_code=500, 
-                detail=f"Error descargando la imagen de Cloudinary: {str(e)}"
-            )
-    else:
-        # Convertir la URL relativa a una ruta local absoluta
+    # Si la imagen está en Cloudinary o es una URL externa, GPT-4o la lee directamente de la URL;
+    # si no, convertir la URL relativa a una ruta local absoluta
+    if not image_url.startswith(("http://", "https://")):
         filename = os.path.basename(image_url)
         local_image_path = os.path.join(settings.RESULTS_FOLDER, filename)
         
@@ -339,14 +458,16 @@ async def update_pixel_art(
                 status_code=404, 
                 detail="No se encontró la imagen local para aplicar cambios"
             )
+        image_url = None
     
     try:
-        # Procesar la imagen con OpenAI
+        # Procesar la imagen con OpenAI (desde su URL pública o desde disco)
         processed_image_data = await openai_service.update_image(
             local_image_path,
             prompt,
             process_settings,
-            palette["colors"]
+            palette["colors"],
+            image_url=image_url
         )
         
         if not processed_image_data:
@@ -355,47 +476,33 @@ async def update_pixel_art(
                 detail="Error al procesar la imagen con OpenAI"
             )
         
-        # Guardar la versión anterior en el historial
-        version_history = existing_pixel_art.get("versionHistory", [])
-        # Si no existe el historial, inicializarlo
-        if version_history is None:
-            version_history = []
-            logger.info(f"Initializing version history for pixel art {pixel_art_id}")
-        
-        # Crear entrada para la versión actual (que pasará a ser una versión anterior)
+        # Crear entrada para la versión actual (que pasará a ser una versión anterior);
+        # el historial se añade y recorta en MongoDB con $push/$slice
         version_entry = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
             "imageUrl": existing_pixel_art["imageUrl"],
             "thumbnailUrl": existing_pixel_art["thumbnailUrl"],
             "prompt": existing_pixel_art.get("prompt", ""),
-            "changes": pixel_art_update
+            "changes": updates
         }
         
-        # Limitar historial a 5 versiones como máximo
-        if len(version_history) >= 5:
-            version_history = version_history[-4:] # Mantener solo las 4 más recientes
-        
-        version_history.append(version_entry)
-        logger.info(f"Added version to history, now has {len(version_history)} versions")
         # Actualizar el pixel art con la nueva imagen y metadatos
-        update_data = pixel_art_update.copy()
-        update_data.update({
+        update_data = {
+            **updates,
             "imageUrl": processed_image_data["image_url"],
             "thumbnailUrl": processed_image_data["thumbnail_url"],
             "width": processed_image_data["width"],
             "height": processed_image_data["height"],
-            "prompt": prompt,
-            "versionHistory": version_history,
-            "updatedAt": datetime.now()
-        })
-        logger.info(f"Updating pixel art with new data including version history")
+            "prompt": prompt
+        }
         
         # Crear el registro actualizado en la base de datos con soporte para Cloudinary
-        updated_pixel_art = pixel_art_service.update_pixel_art_with_image(
+        updated_pixel_art = await pixel_art_service.update_pixel_art_with_image(
             pixel_art_id, 
             update_data, 
             processed_image_data,
-            cloudinary_service if settings.USE_CLOUDINARY else None
+            cloudinary_service if settings.USE_CLOUDINARY else None,
+            version_entry=version_entry
         )
         
         return updated_pixel_art
@@ -405,11 +512,4 @@ async def update_pixel_art(
         import traceback
         logger.error(traceback.format_exc())
         
-        # Limpiar archivos temporales
-        if local_image_path and "temp_" in local_image_path and os.path.exists(local_image_path):
-            try:
-                os.remove(local_image_path)
-            except:
-                pass
-        
         raise HTTPException(status_code=500, detail=f"Error updating pixel art: {str(e)}")
\ No newline at end of file
@@ -1,7 +1,6 @@
 # app/config.py
-from pydantic_settings import BaseSettings
-import os
-from typing import Optional
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import List, Optional
 
 class Settings(BaseSettings):
     PROJECT_NAME: str = "PixelArt Generator API"
@@ -12,30 +11,71 @@ class Settings(BaseSettings):
     # Base de datos SQLite (para compatibilidad con código existente)
     DATABASE_URL: str = "sqlite:///./pixelart.db"
     
+    # Pool de conexiones de SQLAlchemy
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_RECYCLE: int = 1800
+    # Segundos que SQLite espera a que se libere un bloqueo antes de fallar con "database is locked"
+    DB_BUSY_TIMEOUT: int = 30
+    
     # Configuración MongoDB
-    MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "pixelart_db")
+    MONGODB_URL: str = "mongodb://localhost:27017"
+    MONGODB_DB_NAME: str = "pixelart_db"
     
     # Directorio para subidas y resultados
+    IMAGES_FOLDER: str = "./images"
     UPLOAD_FOLDER: str = "./images/uploads"
     RESULTS_FOLDER: str = "./images/results"
+    # Cachés de imágenes en disco (fuera de IMAGES_FOLDER para que no se sirvan públicamente)
+    CACHE_FOLDER: str = "./cache"
+    # Servir /images desde la API (desactivar si lo sirve un proxy como nginx)
+    SERVE_STATIC_IMAGES: bool = True
+    # Hosts cuyas imágenes la API retransmite en /pixel-arts/{id}/image; el resto se redirige
+    IMAGE_PROXY_ALLOWED_HOSTS: List[str] = ["res.cloudinary.com"]
+    
+    # Tamaño máximo permitido para las imágenes subidas (10 MB)
+    MAX_UPLOAD_BYTES: int = 10 * 1024 * 1024
+    # Las subidas de hasta este tamaño se procesan en memoria, sin archivo temporal (2 MB)
+    IN_MEMORY_MAX_BYTES: int = 2 * 1024 * 1024
+    # Tiempo que se conservan los resultados en la caché de subidas repetidas (7 días)
+    PROCESSED_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Tamaño máximo de la caché en disco de resultados de pixelado (se eliminan los menos usados)
+    PROCESSED_FILE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # Procesos del pool de pixelado por cada worker de uvicorn (se multiplican por el número de workers)
+    IMAGE_PROCESS_WORKERS: int = 2
     
     # Configuración OpenAI
-    OPENAI_API_KEY: str = os.getenv("OPENAI_API_KEY", "")
+    OPENAI_API_KEY: str = ""
+    # Máximo de llamadas simultáneas a OpenAI desde este proceso
+    OPENAI_MAX_CONCURRENCY: int = 5
+    # Intentos por llamada a OpenAI (y por descarga) ante errores transitorios: 429, 5xx, red
+    OPENAI_RETRY_ATTEMPTS: int = 4
+    # Reutilizar la imagen ya generada cuando se repite el mismo prompt de DALL-E (7 días)
+    OPENAI_CACHE_GENERATIONS: bool = True
+    OPENAI_GENERATION_CACHE_TTL_SECONDS: int = 7 * 24 * 3600
+    # Tamaño máximo de la caché en disco de imágenes generadas (se eliminan las más antiguas)
+    OPENAI_GENERATION_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    # Tiempo que se reutiliza el análisis de GPT-4o de una misma imagen (30 días)
+    OPENAI_VISION_CACHE_TTL_SECONDS: int = 30 * 24 * 3600
     
     # Cloudinary
-    USE_CLOUDINARY: bool = os.getenv("USE_CLOUDINARY", "False").lower() == "true"
-    CLOUDINARY_CLOUD_NAME: str = os.getenv("CLOUDINARY_CLOUD_NAME", "")
-    CLOUDINARY_API_KEY: str = os.getenv("CLOUDINARY_API_KEY", "")
-    CLOUDINARY_API_SECRET: str = os.getenv("CLOUDINARY_API_SECRET", "")
+    USE_CLOUDINARY: bool = False
+    CLOUDINARY_CLOUD_NAME: str = ""
+    CLOUDINARY_API_KEY: str = ""
+    CLOUDINARY_API_SECRET: str = ""
     DELETE_LOCAL_FILES_AFTER_UPLOAD: bool = True
-    model_config = {
-        "env_file": ".env",
-        "extra": "ignore"  # Ignora campos extra que no estén definidos
-    }
-
-    # class Config:
-    #     env_file = ".env"
+    # Subidas simultáneas a Cloudinary en las operaciones por lotes
+    CLOUDINARY_UPLOAD_WORKERS: int = 8
+    # A partir de este tamaño (bytes) las imágenes se suben por partes con upload_large
+    CLOUDINARY_CHUNKED_UPLOAD_THRESHOLD: int = 20 * 1024 * 1024
+    CLOUDINARY_UPLOAD_CHUNK_SIZE: int = 6_000_000
+    # Intentos por subida antes de dar el error por definitivo
+    CLOUDINARY_UPLOAD_ATTEMPTS: int = 3
+    # pydantic-settings lee las variables de entorno y el .env una sola vez, al crear `settings`
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        extra="ignore"  # Ignora campos extra que no estén definidos
+    )
 
 
-settings = Settings()
\ No newline at end of file
+settings = Settings()
@@ -1,17 +1,81 @@
 #app/database/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
 
+# Parámetros del pool compartidos por los motores síncrono y asíncrono
+_POOL_OPTIONS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_pre_ping": True,
+    "pool_recycle": settings.DB_POOL_RECYCLE,
+}
+
 # Crear el motor de SQLAlchemy
 engine = create_engine(
-    settings.DATABASE_URL, connect_args={"check_same_thread": False}
+    settings.DATABASE_URL,
+    connect_args={"check_same_thread": False, "timeout": settings.DB_BUSY_TIMEOUT},
+    **_POOL_OPTIONS
 )
 
 # Crear una sesión local
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _async_database_url(url: str) -> str:
+    """
+    Convierte la URL de SQLite al driver asíncrono (aiosqlite).
+    """
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    return url
+
+# Motor asíncrono para las rutas de lectura que se ejecutan en el event loop
+# (aiosqlite usa NullPool por defecto; se fuerza un pool para reutilizar conexiones)
+async_engine = create_async_engine(
+    _async_database_url(settings.DATABASE_URL),
+    poolclass=AsyncAdaptedQueuePool,
+    connect_args={"timeout": settings.DB_BUSY_TIMEOUT},
+    **_POOL_OPTIONS
+)
+
+# Sesiones asíncronas (sin expirar al hacer commit para poder serializar después)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+# PRAGMAs de SQLite aplicados a cada conexión nueva: WAL (los lectores no bloquean al
+# escritor), menos fsync, caché de páginas de 64 MB y mmap de 256 MB
+_SQLITE_PRAGMAS = (
+    "journal_mode=WAL",
+    "synchronous=NORMAL",
+    "cache_size=-64000",
+    "temp_store=MEMORY",
+    "mmap_size=268435456",
+    "foreign_keys=ON",
+)
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(f"PRAGMA {pragma}")
+    cursor.close()
+
+if settings.DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+def optimize_sqlite():
+    """
+    Ejecuta PRAGMA optimize (ANALYZE solo de lo que lo necesita, con un límite de filas
+    por índice) para que el planificador tenga estadísticas al día. Pensado para el apagado.
+    """
+    if not settings.DATABASE_URL.startswith("sqlite"):
+        return
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA analysis_limit=400")
+        conn.exec_driver_sql("PRAGMA optimize")
+
 # Crear la base para los modelos
 Base = declarative_base()
 
@@ -21,4 +85,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependencia para obtener una sesión asíncrona de base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
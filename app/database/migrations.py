@@ -1,77 +1,224 @@
 # app/database/migrations.py
 import logging
-from sqlalchemy import create_engine, text
-from app.config import settings
+import uuid
+from app.database.database import engine
+from app.models.pixel_art import PixelArtStyle, BackgroundType, AnimationType
 
 logger = logging.getLogger(__name__)
 
+# Versión del esquema que espera el código: incrementarla al añadir migraciones nuevas
+CURRENT_SCHEMA_VERSION = 2
+
+CREATE_SCHEMA_MIGRATIONS_SQL = "CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY)"
+
+# Columnas que debemos verificar y añadir si no existen
+# La tupla contiene (nombre_columna, tipo_sql)
+PIXEL_ARTS_COLUMNS = (
+    ("description", "TEXT"),
+    ("updatedAt", "DATETIME"),
+    ("createdAt", "DATETIME"),
+    ("cloudinaryPublicId", "TEXT"),
+)
+
+USER_SETTINGS_COLUMNS = (
+    ("createdAt", "DATETIME"),
+    ("updatedAt", "DATETIME"),
+)
+
+# SQLite no permite ADD COLUMN con un DEFAULT no constante (CURRENT_TIMESTAMP) en tablas
+# con filas: la columna se añade sin él y las filas existentes se rellenan con un UPDATE
+BACKFILL_COLUMNS = {
+    "createdAt": "CURRENT_TIMESTAMP",
+}
+
+# Columnas de pixel_arts que guardan el código entero del Enum en lugar del texto
+PIXEL_ARTS_ENUM_COLUMNS = (
+    ("style", PixelArtStyle),
+    ("backgroundType", BackgroundType),
+    ("animationType", AnimationType),
+)
+
+PIXEL_ARTS_INDEXES_SQL = (
+    'CREATE INDEX IF NOT EXISTS ix_px_style_palette ON pixel_arts (style, "paletteId")',
+    'CREATE INDEX IF NOT EXISTS ix_px_palette_created ON pixel_arts ("paletteId", "createdAt" DESC)',
+    'CREATE INDEX IF NOT EXISTS "ix_pixel_arts_backgroundType" ON pixel_arts ("backgroundType")',
+    'CREATE INDEX IF NOT EXISTS "ix_pixel_arts_createdAt" ON pixel_arts ("createdAt")',
+)
+
+def _column_statements(table: str, columns: tuple) -> tuple:
+    """
+    Genera una sola vez, al importar el módulo, las sentencias para añadir cada columna:
+    ((nombre_columna, (ALTER, [UPDATE de relleno])), ...)
+    """
+    statements = []
+    for column_name, column_type in columns:
+        sql = [f"ALTER TABLE {table} ADD COLUMN {column_name} {column_type}"]
+        if column_name in BACKFILL_COLUMNS:
+            sql.append(f"UPDATE {table} SET {column_name} = {BACKFILL_COLUMNS[column_name]}")
+        statements.append((column_name, tuple(sql)))
+    return tuple(statements)
+
+def _enum_update_sql(column_name: str, enum_class) -> str:
+    """
+    UPDATE que sustituye el texto de una columna Enum por su código entero.
+    """
+    values = [member.value for member in enum_class]
+    cases = " ".join(f"WHEN '{value}' THEN {code}" for code, value in enumerate(values))
+    in_list = ", ".join(f"'{value}'" for value in values)
+    return (
+        f'UPDATE pixel_arts SET "{column_name}" = CASE "{column_name}" {cases} END '
+        f'WHERE "{column_name}" IN ({in_list})'
+    )
+
+# SQL precalculado (no se formatea nada en cada arranque)
+PIXEL_ARTS_COLUMN_SQL = _column_statements("pixel_arts", PIXEL_ARTS_COLUMNS)
+USER_SETTINGS_COLUMN_SQL = _column_statements("user_settings", USER_SETTINGS_COLUMNS)
+PIXEL_ARTS_ENUM_SQL = tuple(
+    (column_name, _enum_update_sql(column_name, enum_class))
+    for column_name, enum_class in PIXEL_ARTS_ENUM_COLUMNS
+)
+
+CREATE_USER_SETTINGS_SQL = """
+    CREATE TABLE IF NOT EXISTS user_settings (
+        userId TEXT PRIMARY KEY,
+        pixelSize INTEGER DEFAULT 8,
+        defaultStyle TEXT DEFAULT 'retro',
+        defaultPalette TEXT DEFAULT 'gameboy',
+        contrast INTEGER DEFAULT 50,
+        sharpness INTEGER DEFAULT 70,
+        defaultBackground TEXT DEFAULT 'transparent',
+        defaultAnimationType TEXT DEFAULT 'none',
+        theme TEXT DEFAULT 'dark',
+        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+        updatedAt DATETIME
+    )
+"""
+
+def _existing_columns(conn, table: str) -> frozenset:
+    """
+    Devuelve los nombres de las columnas de una tabla (vacío si la tabla no existe).
+    """
+    return frozenset(row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})"))
+
+def _add_missing_columns(conn, table: str, column_sql: tuple) -> int:
+    """
+    Añade a la tabla las columnas de `column_sql` que todavía no tiene.
+    
+    Returns:
+        Número de columnas añadidas
+    """
+    existing = _existing_columns(conn, table)
+    added = 0
+    for column_name, statements in column_sql:
+        if column_name not in existing:
+            logger.info(f"Añadiendo columna '{column_name}' a la tabla {table}")
+            for sql in statements:
+                conn.exec_driver_sql(sql)
+            added += 1
+    return added
+
+def _schema_version(conn) -> int:
+    """
+    Devuelve la última versión de esquema aplicada (0 si nunca se ha migrado).
+    """
+    if not conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_migrations'"
+    ).fetchone():
+        return 0
+    return conn.exec_driver_sql("SELECT MAX(version) FROM schema_migrations").scalar() or 0
+
+def get_schema_version() -> int:
+    """
+    Versión de esquema aplicada en la base de datos (una sola consulta en arranques en caliente).
+    """
+    with engine.connect() as conn:
+        return _schema_version(conn)
+
+def _encode_enum_columns(conn) -> int:
+    """
+    Reescribe los valores de texto de las columnas Enum de pixel_arts con su código
+    entero (posición en el Enum). Las filas ya convertidas no se tocan.
+    
+    Returns:
+        Número de filas actualizadas
+    """
+    updated = 0
+    for column_name, sql in PIXEL_ARTS_ENUM_SQL:
+        result = conn.exec_driver_sql(sql)
+        if result.rowcount > 0:
+            logger.info(f"Convertidas {result.rowcount} filas de pixel_arts.{column_name} a código entero")
+            updated += result.rowcount
+    return updated
+
+def _encode_uuid_ids(conn) -> int:
+    """
+    Convierte los IDs de pixel_arts guardados como texto en BLOB de 16 bytes.
+    Los IDs que no son UUID válidos se dejan como están.
+    
+    Returns:
+        Número de filas actualizadas
+    """
+    rows = conn.exec_driver_sql("SELECT id FROM pixel_arts WHERE typeof(id) = 'text'").fetchall()
+    params = []
+    for (pixel_art_id,) in rows:
+        try:
+            params.append((uuid.UUID(pixel_art_id).bytes, pixel_art_id))
+        except ValueError:
+            logger.warning(f"ID de pixel art no convertible a UUID: {pixel_art_id}")
+    if params:
+        conn.exec_driver_sql("UPDATE pixel_arts SET id = ? WHERE id = ?", params)
+        logger.info(f"Convertidos {len(params)} IDs de pixel_arts a BLOB(16)")
+    return len(params)
+
 def run_migrations():
     """
     Ejecuta las migraciones necesarias para actualizar el esquema de la base de datos.
+    No hace nada si la base de datos ya está en CURRENT_SCHEMA_VERSION.
     """
     try:
-        # Conectar a la base de datos
-        engine = create_engine(settings.DATABASE_URL)
-        
-        # Definir las columnas que debemos verificar y añadir si no existen
-        # La tupla contiene (nombre_columna, tipo_sql)
-        pixel_arts_columns = [
-            ("description", "TEXT"),
-            ("updatedAt", "DATETIME"),
-            ("createdAt", "DATETIME DEFAULT CURRENT_TIMESTAMP"),
-            ("cloudinaryPublicId", "TEXT")
-        ]
+        if get_schema_version() >= CURRENT_SCHEMA_VERSION:
+            logger.info(f"Esquema al día (versión {CURRENT_SCHEMA_VERSION}), no hay migraciones pendientes")
+            return True
         
-        # Añadir las columnas faltantes a la tabla pixel_arts
-        with engine.connect() as conn:
-            # Verificar las columnas existentes
-            result = conn.execute(text("PRAGMA table_info(pixel_arts)"))
-            existing_columns = [row[1] for row in result]
+        # Todas las comprobaciones y DDL en una única transacción (un solo commit/fsync)
+        with engine.begin() as conn:
+            # pysqlite no abre transacción antes de sentencias DDL: BEGIN explícito para
+            # que los ALTER/CREATE no se confirmen uno a uno
+            if conn.dialect.name == "sqlite":
+                conn.exec_driver_sql("BEGIN")
             
-            # Añadir las columnas que faltan
-            for column_name, column_type in pixel_arts_columns:
-                if column_name not in existing_columns:
-                    logger.info(f"Añadiendo columna '{column_name}' a la tabla pixel_arts")
-                    conn.execute(text(f"ALTER TABLE pixel_arts ADD COLUMN {column_name} {column_type}"))
+            # Añadir las columnas faltantes a la tabla pixel_arts
+            changes = _add_missing_columns(conn, "pixel_arts", PIXEL_ARTS_COLUMN_SQL)
             
-            # Verificar la existencia de la tabla user_settings
-            result = conn.execute(text("SELECT name FROM sqlite_master WHERE type='table' AND name='user_settings'"))
+            # Guardar style/backgroundType/animationType como enteros y crear los índices de pixel_arts
+            changes += _encode_enum_columns(conn)
+            changes += _encode_uuid_ids(conn)
+            # (sentencia a sentencia con exec_driver_sql: executescript() hace COMMIT antes de
+            # empezar y rompería la transacción única)
+            for index_sql in PIXEL_ARTS_INDEXES_SQL:
+                conn.exec_driver_sql(index_sql)
+            
+            # Crear la tabla user_settings o completar sus columnas
+            result = conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type='table' AND name='user_settings'")
             if not result.fetchone():
                 logger.info("Creando tabla user_settings")
-                conn.execute(text("""
-                    CREATE TABLE IF NOT EXISTS user_settings (
-                        userId TEXT PRIMARY KEY,
-                        pixelSize INTEGER DEFAULT 8,
-                        defaultStyle TEXT DEFAULT 'retro',
-                        defaultPalette TEXT DEFAULT 'gameboy',
-                        contrast INTEGER DEFAULT 50,
-                        sharpness INTEGER DEFAULT 70,
-                        defaultBackground TEXT DEFAULT 'transparent',
-                        defaultAnimationType TEXT DEFAULT 'none',
-                        theme TEXT DEFAULT 'dark',
-                        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updatedAt DATETIME
-                    )
-                """))
+                conn.exec_driver_sql(CREATE_USER_SETTINGS_SQL)
+                changes += 1
             else:
-                # Verificar columnas en user_settings
-                result = conn.execute(text("PRAGMA table_info(user_settings)"))
-                existing_columns = [row[1] for row in result]
-                
-                user_settings_columns = [
-                    ("createdAt", "DATETIME DEFAULT CURRENT_TIMESTAMP"),
-                    ("updatedAt", "DATETIME")
-                ]
-                
-                for column_name, column_type in user_settings_columns:
-                    if column_name not in existing_columns:
-                        logger.info(f"Añadiendo columna '{column_name}' a la tabla user_settings")
-                        conn.execute(text(f"ALTER TABLE user_settings ADD COLUMN {column_name} {column_type}"))
+                changes += _add_missing_columns(conn, "user_settings", USER_SETTINGS_COLUMN_SQL)
+            
+            # Registrar la versión aplicada para saltar las comprobaciones en el próximo arranque
+            conn.exec_driver_sql(CREATE_SCHEMA_MIGRATIONS_SQL)
+            conn.exec_driver_sql(
+                "INSERT OR IGNORE INTO schema_migrations (version) VALUES (?)", (CURRENT_SCHEMA_VERSION,)
+            )
             
-            conn.commit()
+            # Actualizar las estadísticas del planificador si el esquema ha cambiado
+            if changes:
+                conn.exec_driver_sql("ANALYZE")
             
         logger.info("Migración completada con éxito")
         return True
     except Exception as e:
         logger.error(f"Error durante la migración: {str(e)}")
-        return False
\ No newline at end of file
+        return False
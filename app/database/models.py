@@ -1,8 +1,66 @@
 #app/database/models.py
-from sqlalchemy import Column, String, Integer, Boolean, ForeignKey, DateTime, JSON, Text
+import uuid
+from sqlalchemy import Column, String, Integer, SmallInteger, Boolean, ForeignKey, DateTime, JSON, Text, Index, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from app.database.database import Base
+from app.models.pixel_art import PixelArtStyle, BackgroundType, AnimationType
+
+class EnumCode(TypeDecorator):
+    """
+    Guarda un Enum de texto como un entero pequeño (su posición en el Enum) y lo
+    devuelve como el valor de texto original. Tolera filas antiguas que aún
+    contienen el texto (o el número como texto, por la afinidad TEXT de SQLite).
+    """
+    impl = SmallInteger
+    cache_ok = True
+    
+    def __init__(self, enum_class, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.enum_class = enum_class
+        self.values = tuple(member.value for member in enum_class)
+        self.codes = {value: code for code, value in enumerate(self.values)}
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return self.codes[self.enum_class(value).value]
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            if not value.isdigit():
+                return value
+            value = int(value)
+        return self.values[value]
+
+class UUIDType(TypeDecorator):
+    """
+    Guarda un UUID como BLOB de 16 bytes (en lugar de 36 caracteres) y lo devuelve
+    como texto. Un ID que no es UUID se envía como sus bytes UTF-8 (no coincide con
+    ninguna fila, así que la búsqueda simplemente no encuentra nada).
+    """
+    impl = LargeBinary
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, bytes):
+            return value
+        if isinstance(value, uuid.UUID):
+            return value.bytes
+        try:
+            return uuid.UUID(value).bytes
+        except ValueError:
+            return value.encode()
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            return value
+        return str(uuid.UUID(bytes=bytes(value)))
 
 class DBColorPalette(Base):
     __tablename__ = "color_palettes"
@@ -20,21 +78,22 @@ class DBColorPalette(Base):
 class DBPixelArt(Base):
     __tablename__ = "pixel_arts"
     
-    id = Column(String, primary_key=True, index=True)
+    id = Column(UUIDType, primary_key=True, index=True, default=uuid.uuid4)
     name = Column(String, nullable=False)
     imageUrl = Column(String, nullable=False)
     thumbnailUrl = Column(String, nullable=False)
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
     pixelSize = Column(Integer, nullable=False, default=8)
-    style = Column(String, nullable=False)
-    backgroundType = Column(String, nullable=False)
-    animationType = Column(String, nullable=False, default="none")
+    style = Column(EnumCode(PixelArtStyle), nullable=False)
+    backgroundType = Column(EnumCode(BackgroundType), nullable=False, index=True)
+    animationType = Column(EnumCode(AnimationType), nullable=False, default=AnimationType.NONE.value)
     isAnimated = Column(Boolean, default=False)
+    # Sigue siendo texto: los IDs de paleta son slugs ("gameboy", "nes"...), no UUID
     paletteId = Column(String, ForeignKey("color_palettes.id"))
     tags = Column(JSON, nullable=True, default=list)
     description = Column(Text, nullable=True)
-    createdAt = Column(DateTime(timezone=True), server_default=func.now())
+    createdAt = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updatedAt = Column(DateTime(timezone=True), onupdate=func.now())
     
     # Nuevo campo para el ID público de Cloudinary
@@ -42,6 +101,12 @@ class DBPixelArt(Base):
     
     # Relación con la paleta
     palette = relationship("DBColorPalette", back_populates="pixel_arts")
+    
+    __table_args__ = (
+        # También sirven para filtrar solo por style o solo por paletteId (columna inicial)
+        Index("ix_px_style_palette", "style", "paletteId"),
+        Index("ix_px_palette_created", "paletteId", createdAt.desc()),
+    )
 
 class DBUserSettings(Base):
     __tablename__ = "user_settings"
@@ -1,8 +1,7 @@
 #app/database/mongodb.py
+import asyncio
 import motor.motor_asyncio
 import logging
-from pymongo import MongoClient
-from pymongo.collection import Collection
 from app.config import settings
 
 # Configuración de logging
@@ -12,36 +11,40 @@ logger = logging.getLogger(__name__)
 async_client = motor.motor_asyncio.AsyncIOMotorClient(settings.MONGODB_URL)
 async_db = async_client[settings.MONGODB_DB_NAME]
 
-# Cliente de MongoDB para operaciones síncronas
-sync_client = MongoClient(settings.MONGODB_URL)
-sync_db = sync_client[settings.MONGODB_DB_NAME]
-
 # Colecciones
 pixel_arts_collection = async_db.pixel_arts
 palettes_collection = async_db.palettes
 user_settings_collection = async_db.user_settings
-
-# Colecciones síncronas (para compatibilidad con código existente)
-sync_pixel_arts_collection = sync_db.pixel_arts
-sync_palettes_collection = sync_db.palettes
-sync_user_settings_collection = sync_db.user_settings
-
-# Función para obtener una colección de MongoDB de manera síncrona
-def get_collection(collection_name: str) -> Collection:
-    return sync_db[collection_name]
+processed_cache_collection = async_db.processed_cache
 
 # Inicializar índices en MongoDB
 async def init_mongodb():
     try:
-        # Crear índices para búsquedas rápidas
-        await pixel_arts_collection.create_index("id", unique=True)
-        await palettes_collection.create_index("id", unique=True)
-        await user_settings_collection.create_index("userId", unique=True)
-        
-        # Índices adicionales para búsquedas comunes
-        await pixel_arts_collection.create_index("tags")
-        await pixel_arts_collection.create_index("paletteId")
-        await pixel_arts_collection.create_index("style")
+        # Los índices son independientes: se crean en paralelo sobre el pool en lugar de
+        # esperar un round-trip por cada uno
+        await asyncio.gather(
+            # Índices para búsquedas rápidas
+            pixel_arts_collection.create_index("id", unique=True),
+            palettes_collection.create_index("id", unique=True),
+            user_settings_collection.create_index("userId", unique=True),
+            
+            # Índices adicionales para búsquedas comunes
+            pixel_arts_collection.create_index("tags"),
+            pixel_arts_collection.create_index("paletteId"),
+            pixel_arts_collection.create_index("style"),
+            
+            # Índices para search_pixel_arts: filtros combinados ordenados por fecha y búsqueda de texto
+            pixel_arts_collection.create_index(
+                [("style", 1), ("paletteId", 1), ("tags", 1), ("createdAt", -1)]
+            ),
+            pixel_arts_collection.create_index([("name", "text"), ("tags", "text")]),
+            
+            # Caché de resultados de subidas repetidas: MongoDB elimina las entradas caducadas
+            processed_cache_collection.create_index(
+                "createdAt", expireAfterSeconds=settings.PROCESSED_CACHE_TTL_SECONDS
+            ),
+            processed_cache_collection.create_index("imageUrl"),
+        )
         
         logger.info("MongoDB: Índices inicializados correctamente")
     except Exception as e:
@@ -1,18 +1,24 @@
 #app/main.py
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
+import httpx
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from sqlalchemy.orm import Session
 from app.api import api_router
 from app.config import settings
-from app.database.database import get_db, engine
+from app.database.database import get_db, engine, optimize_sqlite
 from app.database.models import Base
 from app.services.palette import PaletteService
 from app.services.palette_mongo import PaletteMongoService
-from app.database.migrations import run_migrations
+from app.database.migrations import run_migrations, get_schema_version, CURRENT_SCHEMA_VERSION
 from app.database.mongodb import init_mongodb
+from app.services.image_processing import shutdown_process_pool
+from app.api.deps import close_services
 
 # Configurar logging
 logging.basicConfig(
@@ -28,17 +34,111 @@ origins = [
 
 logger = logging.getLogger(__name__)
 
-# Crear las tablas en la base de datos SQLite (para compatibilidad)
-Base.metadata.create_all(bind=engine)
+class JSONGZipMiddleware(GZipMiddleware):
+    """
+    Comprime con gzip las respuestas de la API; las imágenes (PNG/JPEG, ya comprimidas),
+    tanto estáticas como las servidas por /{id}/image, se envían sin pasar por la compresión.
+    """
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (
+            scope["path"].startswith("/images/") or scope["path"].endswith("/image")
+        ):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+# Crear las tablas y ejecutar las migraciones solo si el esquema no está al día
+# (en un arranque en caliente basta con consultar schema_migrations)
+if get_schema_version() < CURRENT_SCHEMA_VERSION:
+    # Crear las tablas en la base de datos SQLite (para compatibilidad)
+    Base.metadata.create_all(bind=engine)
+    
+    # Ejecutar migraciones adicionales para actualizar el esquema
+    run_migrations()
+
+def _init_sqlite_palettes():
+    """
+    Inicializa las paletas predeterminadas en SQLite (para compatibilidad).
+    Es E/S bloqueante: se ejecuta en un hilo para no detener el event loop.
+    """
+    db = next(get_db())
+    try:
+        PaletteService.initialize_default_palettes(db)
+        logger.info("Default palettes initialized in SQLite")
+    except Exception as e:
+        logger.error(f"Error initializing default palettes in SQLite: {str(e)}")
+    finally:
+        db.close()
 
-# Ejecutar migraciones adicionales para actualizar el esquema
-run_migrations()
+async def _init_mongo():
+    """
+    Inicializa MongoDB, sus índices y las paletas predeterminadas.
+    """
+    try:
+        await init_mongodb()
+        logger.info("MongoDB initialized successfully")
+        
+        # Inicializar paletas predeterminadas en MongoDB
+        count = await PaletteMongoService.initialize_default_palettes()
+        logger.info(f"Default palettes initialized in MongoDB: {count} palettes")
+    except Exception as e:
+        logger.error(f"Error initializing MongoDB: {str(e)}")
+
+# Arranque de la aplicación
+async def startup_event(app: FastAPI):
+    logger.info("Starting up PixelArt Generator API...")
+    
+    # Crear las carpetas necesarias si no existen
+    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    os.makedirs(settings.RESULTS_FOLDER, exist_ok=True)
+    
+    # Cliente HTTP asíncrono compartido (reutiliza conexiones TLS entre peticiones)
+    app.state.http = httpx.AsyncClient(
+        timeout=30.0,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=100)
+    )
+    
+    # Las inicializaciones de SQLite y MongoDB son independientes: se solapan
+    await asyncio.gather(
+        asyncio.to_thread(_init_sqlite_palettes),
+        _init_mongo()
+    )
+
+# Apagado de la aplicación
+async def shutdown_event(app: FastAPI):
+    logger.info("Shutting down PixelArt Generator API...")
+    
+    # Cerrar el pool de procesos de imágenes
+    shutdown_process_pool()
+    
+    # Refrescar las estadísticas de SQLite para el próximo arranque
+    try:
+        optimize_sqlite()
+    except Exception as e:
+        logger.warning(f"Error running PRAGMA optimize: {str(e)}")
+    
+    # Cerrar los clientes HTTP compartidos
+    await app.state.http.aclose()
+    await close_services()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Ciclo de vida de la aplicación: inicialización al arrancar y limpieza al apagar.
+    """
+    await startup_event(app)
+    try:
+        yield
+    finally:
+        await shutdown_event(app)
 
 # Inicializar la aplicación
 app = FastAPI(
     title=settings.PROJECT_NAME,
     description=settings.DESCRIPTION,
     version=settings.VERSION,
+    lifespan=lifespan,
 )
 
 # Configurar CORS
@@ -50,45 +150,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Montar las carpetas estáticas para servir imágenes
-app.mount("/images/results", StaticFiles(directory=settings.RESULTS_FOLDER), name="results")
-app.mount("/images/uploads", StaticFiles(directory=settings.UPLOAD_FOLDER), name="uploads")
-
-
+# Comprimir las respuestas JSON grandes (listas de pixel arts y paletas)
+app.add_middleware(JSONGZipMiddleware, minimum_size=1024, compresslevel=5)
+
+# Montar las carpetas estáticas para servir imágenes (en producción puede desactivarse
+# con SERVE_STATIC_IMAGES=false y servirlas desde nginx)
+if settings.SERVE_STATIC_IMAGES:
+    images_root = os.path.normpath(settings.IMAGES_FOLDER)
+    if (
+        os.path.normpath(settings.RESULTS_FOLDER) == os.path.join(images_root, "results")
+        and os.path.normpath(settings.UPLOAD_FOLDER) == os.path.join(images_root, "uploads")
+    ):
+        # Un único montaje para /images/results y /images/uploads
+        app.mount("/images", StaticFiles(directory=images_root, check_dir=False), name="images")
+    else:
+        # Carpetas personalizadas fuera de IMAGES_FOLDER: un montaje por carpeta
+        app.mount("/images/results", StaticFiles(directory=settings.RESULTS_FOLDER, check_dir=False), name="results")
+        app.mount("/images/uploads", StaticFiles(directory=settings.UPLOAD_FOLDER, check_dir=False), name="uploads")
 
 # Incluir rutas de la API
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
-# Evento de inicio
-@app.on_event("startup")
-async def startup_event():
-    logger.info("Starting up PixelArt Generator API...")
-    
-    # Crear las carpetas necesarias si no existen
-    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
-    os.makedirs(settings.RESULTS_FOLDER, exist_ok=True)
-    
-    # Inicializar paletas predeterminadas en SQLite (para compatibilidad)
-    db = next(get_db())
-    try:
-        PaletteService.initialize_default_palettes(db)
-        logger.info("Default palettes initialized in SQLite")
-    except Exception as e:
-        logger.error(f"Error initializing default palettes in SQLite: {str(e)}")
-    finally:
-        db.close()
-    
-    # Inicializar MongoDB y sus índices
-    try:
-        await init_mongodb()
-        logger.info("MongoDB initialized successfully")
-        
-        # Inicializar paletas predeterminadas en MongoDB
-        count = PaletteMongoService.initialize_default_palettes()
-        logger.info(f"Default palettes initialized in MongoDB: {count} palettes")
-    except Exception as e:
-        logger.error(f"Error initializing MongoDB: {str(e)}")
-
 # Ruta raíz
 @app.get("/")
 async def root():
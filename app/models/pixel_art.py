@@ -1,6 +1,6 @@
 #app/models/pixel_art.py
 from enum import Enum
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional
 from datetime import datetime
 
@@ -33,6 +33,15 @@ class ColorPalette(BaseModel):
     colors: List[str]
 
 
+class PaletteUpdate(BaseModel):
+    """Campos actualizables de una paleta (actualización parcial)."""
+    model_config = ConfigDict(extra="forbid")
+    
+    name: Optional[str] = None
+    colors: Optional[List[str]] = None
+    description: Optional[str] = None
+
+
 class PixelArtBase(BaseModel):
     name: str
     pixelSize: int = 8
@@ -44,10 +53,29 @@ class PixelArtBase(BaseModel):
 
 
 class PixelArtCreate(PixelArtBase):
-    pass
+    prompt: Optional[str] = None
+    versionHistory: List[dict] = []
+
+
+class PixelArtUpdate(BaseModel):
+    """Campos actualizables de un pixel art (actualización parcial)."""
+    model_config = ConfigDict(extra="forbid", use_enum_values=True)
+    
+    name: Optional[str] = None
+    pixelSize: Optional[int] = None
+    style: Optional[PixelArtStyle] = None
+    backgroundType: Optional[BackgroundType] = None
+    paletteId: Optional[str] = None
+    animationType: Optional[AnimationType] = None
+    isAnimated: Optional[bool] = None
+    tags: Optional[List[str]] = None
+    description: Optional[str] = None
 
 
 class PixelArtProcessSettings(BaseModel):
+    # Inmutable (y por tanto hashable): nadie la modifica tras crearla y se puede usar como clave de caché
+    model_config = ConfigDict(frozen=True)
+    
     pixelSize: int = 8
     style: PixelArtStyle = PixelArtStyle.RETRO_8BIT
     paletteId: str
@@ -88,6 +116,8 @@ class PaletteList(BaseModel):
 class PixelArtList(BaseModel):
     items: List[PixelArt]
     total: int
+    skip: Optional[int] = None
+    limit: Optional[int] = None
 
 class PixelArtVersion(BaseModel):
     timestamp: str
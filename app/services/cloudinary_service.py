@@ -1,20 +1,120 @@
 #app/services/cloudinary_service.py
 import os
+import re
+import asyncio
+import hashlib
 import logging
+import threading
+from functools import lru_cache
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
-from typing import Optional, Dict, Any, Tuple
+import cloudinary.exceptions
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List, Tuple
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
+from urllib3.exceptions import HTTPError
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Caché de los detalles de recursos de Cloudinary (evita repetir llamadas a la Admin API).
+# Se consulta desde hilos del pool, así que el acceso va protegido con un lock.
+RESOURCE_CACHE_TTL = 300
+_resource_cache = TTLCache(maxsize=1024, ttl=RESOURCE_CACHE_TTL)
+_resource_cache_lock = threading.Lock()
+
+# Caché de búsquedas (TTL corto: cualquier subida nueva puede cambiar los resultados)
+SEARCH_CACHE_TTL = 60
+_search_cache = TTLCache(maxsize=256, ttl=SEARCH_CACHE_TTL)
+
+# Máximo de public_ids que acepta Cloudinary en una llamada de etiquetado
+TAG_BATCH_SIZE = 1000
+
+def _invalidate_resource(public_id: str):
+    """
+    Elimina los detalles de un recurso de la caché tras modificarlo o borrarlo
+    (y las búsquedas en caché, que podrían incluirlo).
+    """
+    with _resource_cache_lock:
+        _resource_cache.pop(public_id, None)
+        _search_cache.clear()
+
+def _resource_data(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Extrae los detalles de un recurso de una respuesta de Cloudinary (la de la subida
+    trae los mismos campos que la de la Admin API).
+    """
+    return {
+        "public_id": result.get("public_id"),
+        "url": result.get("secure_url"),
+        "resource_type": result.get("resource_type"),
+        "format": result.get("format"),
+        "width": result.get("width"),
+        "height": result.get("height"),
+        "bytes": result.get("bytes"),
+        "created_at": result.get("created_at"),
+        "tags": result.get("tags", [])
+    }
+
+@lru_cache(maxsize=4096)
+def _build_thumbnail_url(public_id: str, width: int, height: int, fmt: str) -> str:
+    """
+    Construye la URL de la miniatura (solo depende de los argumentos y de la
+    configuración de Cloudinary, que se fija una vez al arrancar).
+    """
+    return cloudinary.CloudinaryImage(public_id).build_url(
+        width=width,
+        height=height,
+        crop="fill",
+        quality="auto",
+        format=fmt  # Especificar formato para asegurar que tenga extensión
+    )
+
+# Respuesta no JSON de un 5xx (p. ej. la página de error de un proxy intermedio)
+_SERVER_ERROR_RE = re.compile(r"^Error parsing server response \(5\d\d\)")
+
+def _is_transient_upload_error(exc: BaseException) -> bool:
+    """
+    Indica si merece la pena reintentar una subida fallida. El uploader lanza la clase base
+    Error tanto para los fallos de red como para los errores de la API (archivo inválido,
+    credenciales...): solo los primeros, los límites de uso y los 5xx son transitorios.
+    """
+    if isinstance(exc, (cloudinary.exceptions.RateLimited, cloudinary.exceptions.GeneralError)):
+        return True
+    if type(exc) is not cloudinary.exceptions.Error:
+        return False
+    # Error de conexión o timeout: el uploader lo relanza dentro del except
+    if isinstance(exc.__context__, (HTTPError, OSError)):
+        return True
+    return bool(_SERVER_ERROR_RE.match(str(exc)))
+
+@retry(
+    retry=retry_if_exception(_is_transient_upload_error),
+    stop=stop_after_attempt(settings.CLOUDINARY_UPLOAD_ATTEMPTS),
+    wait=wait_exponential(multiplier=0.5, max=8),
+    reraise=True
+)
+def _upload_file(file_path: str, **upload_options) -> Dict[str, Any]:
+    """
+    Sube un archivo a Cloudinary, reintentando los errores de red o del servidor.
+    Los archivos grandes se suben por partes (upload_large) en vez de en un único cuerpo HTTP.
+    """
+    if os.path.getsize(file_path) > settings.CLOUDINARY_CHUNKED_UPLOAD_THRESHOLD:
+        return cloudinary.uploader.upload_large(
+            file_path, chunk_size=settings.CLOUDINARY_UPLOAD_CHUNK_SIZE, **upload_options
+        )
+    return cloudinary.uploader.upload(file_path, **upload_options)
+
 class CloudinaryService:
     """Servicio para gestionar la carga y recuperación de imágenes en Cloudinary."""
     
     def __init__(self):
         """Inicializa la configuración de Cloudinary con las credenciales de las variables de entorno."""
         self.is_configured = False
+        # Pool de hilos para subidas en paralelo (se crea al primer uso)
+        self._pool: Optional[ThreadPoolExecutor] = None
         try:
             cloudinary.config(
                 cloud_name=settings.CLOUDINARY_CLOUD_NAME,
@@ -58,20 +158,18 @@ class CloudinaryService:
             if public_id:
                 upload_options["public_id"] = public_id
                 
-            # Subir la imagen a Cloudinary
-            result = cloudinary.uploader.upload(file_path, **upload_options)
+            # Subir la imagen a Cloudinary (por partes si es grande, con reintentos)
+            result = _upload_file(file_path, **upload_options)
             
             logger.info(f"Image successfully uploaded to Cloudinary: {result.get('public_id')}")
             
-            return {
-                "public_id": result.get("public_id"),
-                "url": result.get("secure_url"),
-                "resource_type": result.get("resource_type"),
-                "width": result.get("width"),
-                "height": result.get("height"),
-                "format": result.get("format"),
-                "created_at": result.get("created_at")
-            }
+            # La respuesta de la subida ya trae los detalles del recurso: se guardan en la
+            # caché para que get_cloudinary_data no tenga que consultar la Admin API
+            data = _resource_data(result)
+            _invalidate_resource(data["public_id"])
+            with _resource_cache_lock:
+                _resource_cache[data["public_id"]] = data
+            return data
             
         except Exception as e:
             logger.error(f"Error uploading image to Cloudinary: {str(e)}")
@@ -95,16 +193,8 @@ class CloudinaryService:
             if "." in public_id:
                 formato = public_id.split(".")[-1]
             
-            # Generar URL de thumbnail usando transformaciones de Cloudinary
-            thumbnail_url = cloudinary.CloudinaryImage(public_id).build_url(
-                width=width,
-                height=height,
-                crop="fill",
-                quality="auto",
-                format=formato  # Especificar formato para asegurar que tenga extensión
-            )
-            
-            return thumbnail_url
+            # Generar URL de thumbnail usando transformaciones de Cloudinary (memorizada)
+            return _build_thumbnail_url(public_id, width, height, formato)
             
         except Exception as e:
             logger.error(f"Error creating thumbnail for image {public_id}: {str(e)}")
@@ -126,6 +216,7 @@ class CloudinaryService:
             
         try:
             result = cloudinary.uploader.destroy(public_id)
+            _invalidate_resource(public_id)
             
             if result.get("result") == "ok":
                 logger.info(f"Image {public_id} successfully deleted from Cloudinary")
@@ -138,9 +229,79 @@ class CloudinaryService:
             logger.error(f"Error deleting image {public_id} from Cloudinary: {str(e)}")
             return False
     
+    @staticmethod
+    def _upload_target(local_file_path: str, is_result: bool) -> Tuple[str, str]:
+        """
+        Devuelve la carpeta y el public_id con los que se sube un archivo local.
+        """
+        # Determinar la carpeta en Cloudinary según el tipo de imagen
+        folder = "results" if is_result else "uploads"
+        
+        # Extraer nombre de archivo para el public_id
+        filename = os.path.basename(local_file_path)
+        name_without_ext = os.path.splitext(filename)[0]
+        
+        # Añadir un hash del contenido: dos archivos distintos con el mismo nombre no se
+        # pisan, y volver a subir el mismo archivo reutiliza su public_id
+        digest = hashlib.blake2b(digest_size=8)
+        with open(local_file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return folder, f"{name_without_ext}_{digest.hexdigest()}"
+    
+    def _upload_local_file(self, local_file_path: str, is_result: bool) -> Dict[str, Any]:
+        """
+        Sube un archivo local a la carpeta que le corresponde, con un public_id basado en su contenido.
+        """
+        folder, custom_public_id = self._upload_target(local_file_path, is_result)
+        return self.upload_image(local_file_path, folder=folder, public_id=custom_public_id)
+    
+    def _upload_summary(self, upload_result: Dict[str, Any]) -> Tuple[str, str, int, int]:
+        """
+        Extrae (image_url, thumbnail_url, width, height) del resultado de una subida.
+        """
+        # Obtener la URL de la imagen
+        image_url = upload_result.get("url")
+        
+        # Obtener datos de dimensiones
+        width = upload_result.get("width", 0)
+        height = upload_result.get("height", 0)
+        
+        # Crear thumbnail
+        public_id = upload_result.get("public_id")
+        thumbnail_size = min(width, height, 300)  # Limitar tamaño máximo de thumbnail
+        thumbnail_url = self.create_thumbnail(public_id, width=thumbnail_size, height=thumbnail_size)
+        
+        return image_url, thumbnail_url, width, height
+    
+    @staticmethod
+    def _local_fallback(local_file_path: str, is_result: bool) -> Tuple[str, str, int, int]:
+        """
+        En caso de error, devuelve la ruta local como fallback.
+        """
+        filename = os.path.basename(local_file_path)
+        base_url = "/images/results" if is_result else "/images/uploads"
+        fallback_url = f"{base_url}/{filename}"
+        
+        return fallback_url, fallback_url, 0, 0
+    
+    @staticmethod
+    def _remove_local_file(local_file_path: str):
+        """
+        Borra el archivo local tras subirlo (no falla si ya no existe).
+        """
+        try:
+            os.remove(local_file_path)
+            logger.info(f"Local file {local_file_path} removed after Cloudinary upload")
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"Failed to remove local file {local_file_path}: {str(e)}")
+    
     def process_image_upload(self, local_file_path: str, is_result: bool = True) -> Tuple[str, str, int, int]:
         """
         Procesa la carga de una imagen y devuelve los datos necesarios para guardar en la base de datos.
+        Versión síncrona para scripts y migraciones; las rutas usan process_image_upload_async.
         
         Args:
             local_file_path: Ruta local de la imagen
@@ -150,55 +311,89 @@ class CloudinaryService:
             Tupla (image_url, thumbnail_url, width, height)
         """
         try:
-            # Determinar la carpeta en Cloudinary según el tipo de imagen
-            folder = "results" if is_result else "uploads"
-            
-            # Extraer nombre de archivo para el public_id
-            filename = os.path.basename(local_file_path)
-            name_without_ext = os.path.splitext(filename)[0]
-            
-            # Subir la imagen a Cloudinary con timestamp para evitar duplicados
-            import time
-            timestamp = int(time.time())
-            custom_public_id = f"{name_without_ext}_{timestamp}"
-            
             # Subir la imagen a Cloudinary
-            upload_result = self.upload_image(
-                local_file_path, 
-                folder=folder,
-                public_id=custom_public_id
-            )
+            upload_result = self._upload_local_file(local_file_path, is_result)
+            summary = self._upload_summary(upload_result)
             
-            # Obtener la URL de la imagen
-            image_url = upload_result.get("url")
+            # Limpiar el archivo local si es una imagen resultado (opcional)
+            if is_result and settings.DELETE_LOCAL_FILES_AFTER_UPLOAD:
+                self._remove_local_file(local_file_path)
             
-            # Obtener datos de dimensiones
-            width = upload_result.get("width", 0)
-            height = upload_result.get("height", 0)
+            return summary
             
-            # Crear thumbnail
-            public_id = upload_result.get("public_id")
-            thumbnail_size = min(width, height, 300)  # Limitar tamaño máximo de thumbnail
-            thumbnail_url = self.create_thumbnail(public_id, width=thumbnail_size, height=thumbnail_size)
+        except Exception as e:
+            logger.error(f"Error processing image upload: {str(e)}")
+            return self._local_fallback(local_file_path, is_result)
+    
+    async def process_image_upload_async(self, local_file_path: str, is_result: bool = True) -> Tuple[str, str, int, int]:
+        """
+        Versión asíncrona de process_image_upload: la lectura y subida del archivo (el SDK de
+        Cloudinary es bloqueante) y el borrado del archivo local se ejecutan en hilos, de modo que el
+        event loop nunca espera a la red ni al disco.
+        """
+        try:
+            upload_result = await asyncio.to_thread(self._upload_local_file, local_file_path, is_result)
+            summary = self._upload_summary(upload_result)
             
-            # Limpiar el archivo local si es una imagen resultado (opcional)
-            if is_result and os.path.exists(local_file_path) and settings.DELETE_LOCAL_FILES_AFTER_UPLOAD:
-                try:
-                    os.remove(local_file_path)
-                    logger.info(f"Local file {local_file_path} removed after Cloudinary upload")
-                except Exception as e:
-                    logger.warning(f"Failed to remove local file {local_file_path}: {str(e)}")
+            if is_result and settings.DELETE_LOCAL_FILES_AFTER_UPLOAD:
+                await asyncio.to_thread(self._remove_local_file, local_file_path)
             
-            return image_url, thumbnail_url, width, height
+            return summary
             
         except Exception as e:
             logger.error(f"Error processing image upload: {str(e)}")
-            # En caso de error, retornar la ruta local como fallback
-            filename = os.path.basename(local_file_path)
-            base_url = "/images/results" if is_result else "/images/uploads"
-            fallback_url = f"{base_url}/{filename}"
+            return self._local_fallback(local_file_path, is_result)
+    
+    def _get_pool(self) -> ThreadPoolExecutor:
+        """
+        Devuelve el pool de hilos para subidas, creándolo la primera vez que se necesita.
+        """
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=settings.CLOUDINARY_UPLOAD_WORKERS,
+                thread_name_prefix="cloudinary"
+            )
+        return self._pool
+    
+    def process_image_uploads_bulk(self, local_file_paths: List[str], is_result: bool = True) -> List[Tuple[str, str, int, int]]:
+        """
+        Sube varias imágenes en paralelo (la subida está limitada por la red, no por la CPU).
+        
+        Args:
+            local_file_paths: Rutas locales de las imágenes
+            is_result: Indica si son imágenes resultado (True) o subidas por el usuario (False)
             
-            return fallback_url, fallback_url, 0, 0
+        Returns:
+            Lista de tuplas (image_url, thumbnail_url, width, height) en el mismo orden que las rutas
+        """
+        return list(self._get_pool().map(
+            lambda path: self.process_image_upload(path, is_result), local_file_paths
+        ))
+    
+    async def process_image_uploads_bulk_async(self, local_file_paths: List[str], is_result: bool = True) -> List[Tuple[str, str, int, int]]:
+        """
+        Versión asíncrona de process_image_uploads_bulk (no bloquea el event loop).
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        return list(await asyncio.gather(*(
+            loop.run_in_executor(pool, self.process_image_upload, path, is_result)
+            for path in local_file_paths
+        )))
+    
+    def close(self):
+        """
+        Cierra el pool de hilos de subidas (se llama al apagar la aplicación).
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+    
+    async def delete_image_async(self, public_id: str) -> bool:
+        """
+        Versión asíncrona de delete_image (se ejecuta en el pool de hilos).
+        """
+        return await asyncio.to_thread(self.delete_image, public_id)
     
     def get_cloudinary_data(self, public_id: str) -> Dict[str, Any]:
         """
@@ -213,21 +408,19 @@ class CloudinaryService:
         if not self.is_configured:
             raise ValueError("Cloudinary service is not properly configured")
             
+        with _resource_cache_lock:
+            cached = _resource_cache.get(public_id)
+        if cached is not None:
+            return cached
+        
         try:
             # Consultar detalles de la imagen
             result = cloudinary.api.resource(public_id)
             
-            return {
-                "public_id": result.get("public_id"),
-                "url": result.get("secure_url"),
-                "resource_type": result.get("resource_type"),
-                "format": result.get("format"),
-                "width": result.get("width"),
-                "height": result.get("height"),
-                "bytes": result.get("bytes"),
-                "created_at": result.get("created_at"),
-                "tags": result.get("tags", [])
-            }
+            data = _resource_data(result)
+            with _resource_cache_lock:
+                _resource_cache[public_id] = data
+            return data
             
         except Exception as e:
             logger.error(f"Error retrieving image data from Cloudinary for {public_id}: {str(e)}")
@@ -249,6 +442,7 @@ class CloudinaryService:
             
         try:
             result = cloudinary.uploader.add_tag(tag, [public_id])
+            _invalidate_resource(public_id)
             
             if result.get("public_ids"):
                 logger.info(f"Tag '{tag}' added to image {public_id}")
@@ -261,6 +455,35 @@ class CloudinaryService:
             logger.error(f"Error adding tag to image: {str(e)}")
             return False
     
+    def add_tags_bulk(self, public_ids: List[str], tag: str) -> int:
+        """
+        Añade una etiqueta a varias imágenes con una llamada a Cloudinary por cada
+        bloque de TAG_BATCH_SIZE imágenes (en lugar de una por imagen).
+        
+        Args:
+            public_ids: IDs públicos de las imágenes en Cloudinary
+            tag: Etiqueta a añadir
+            
+        Returns:
+            Número de imágenes etiquetadas
+        """
+        if not self.is_configured:
+            raise ValueError("Cloudinary service is not properly configured")
+        
+        tagged = 0
+        for start in range(0, len(public_ids), TAG_BATCH_SIZE):
+            chunk = public_ids[start:start + TAG_BATCH_SIZE]
+            try:
+                result = cloudinary.uploader.add_tag(tag, chunk)
+                tagged += len(result.get("public_ids", []))
+            except Exception as e:
+                logger.error(f"Error adding tag '{tag}' to {len(chunk)} images: {str(e)}")
+            for public_id in chunk:
+                _invalidate_resource(public_id)
+        
+        logger.info(f"Tag '{tag}' added to {tagged}/{len(public_ids)} images")
+        return tagged
+    
     def generate_gallery_urls(self, public_ids: list, width: int = 300, height: int = 300) -> list:
         """
         Genera URLs de miniaturas para una galería de imágenes.
@@ -276,6 +499,8 @@ class CloudinaryService:
         if not self.is_configured:
             raise ValueError("Cloudinary service is not properly configured")
             
+        # create_thumbnail solo construye la URL localmente (no hay petición a Cloudinary),
+        # así que un bucle simple es más rápido que repartirlo entre hilos
         thumbnail_urls = []
         
         for public_id in public_ids:
@@ -305,6 +530,12 @@ class CloudinaryService:
         if not self.is_configured:
             raise ValueError("Cloudinary service is not properly configured")
             
+        cache_key = (tuple(tags or ()), folder, limit)
+        with _resource_cache_lock:
+            cached = _search_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
         try:
             # Construir expresión de búsqueda
             expression = ""
@@ -325,7 +556,10 @@ class CloudinaryService:
             # Realizar búsqueda
             result = cloudinary.Search().expression(expression).max_results(limit).execute()
             
-            return result.get("resources", [])
+            resources = result.get("resources", [])
+            with _resource_cache_lock:
+                _search_cache[cache_key] = resources
+            return resources
             
         except Exception as e:
             logger.error(f"Error searching images in Cloudinary: {str(e)}")
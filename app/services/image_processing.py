@@ -1,15 +1,75 @@
 #app/services/image_processing.py
+import io
 import os
-import time
+import mmap
+import asyncio
+import hashlib
+import multiprocessing
+import uuid
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 from PIL import Image, ImageEnhance, ImageFilter
 import numpy as np
-from typing import Tuple, List, Optional, Dict, Any
+from typing import Tuple, List, Optional, Dict, Any, Union, BinaryIO
 from app.config import settings  # This is your application settings
 from app.models.pixel_art import PixelArtProcessSettings, BackgroundType, AnimationType
+from app.utils.image_utils import link_or_copy, prune_cache_folder
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Elementos máximos del temporal (filas, W, K, 3) al buscar el color más cercano con NumPy
+# (solo para paletas de más de 256 colores)
+_PALETTE_CHUNK_ELEMENTS = 4_000_000
+
+# Versión del algoritmo de pixelado: forma parte del nombre de los archivos de salida, así que
+# al cambiarla los resultados generados con la versión anterior dejan de reutilizarse
+_OUTPUT_VERSION = b"2"
+
+# Carpeta de los resultados nombrados por contenido (no se sirve: cada petición recibe
+# enlaces propios en RESULTS_FOLDER)
+_PROCESSED_CACHE_FOLDER = os.path.join(settings.CACHE_FOLDER, "processed")
+
+# Pool de procesos para el trabajo de CPU (pixelado y paleta), fuera del event loop
+_IMG_POOL: Optional[ProcessPoolExecutor] = None
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """
+    Devuelve el pool de procesos, creándolo la primera vez que se necesita.
+    Los hijos se lanzan con "spawn": un fork copiaría el proceso con los hilos de motor y
+    httpx ya en marcha (y sus locks posiblemente tomados), lo que puede bloquear al hijo.
+    """
+    global _IMG_POOL
+    if _IMG_POOL is None:
+        _IMG_POOL = ProcessPoolExecutor(
+            max_workers=settings.IMAGE_PROCESS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _IMG_POOL
+
+def shutdown_process_pool() -> None:
+    """
+    Cierra el pool de procesos (se llama al apagar la aplicación).
+    """
+    global _IMG_POOL
+    if _IMG_POOL is not None:
+        _IMG_POOL.shutdown(wait=True)
+        _IMG_POOL = None
+
+def _process_image_bytes_worker(image_data: bytes, settings_data: Dict[str, Any], palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Punto de entrada en el proceso hijo: solo recibe argumentos serializables.
+    """
+    process_settings = PixelArtProcessSettings(**settings_data)
+    return ImageProcessingService().process_image_bytes(image_data, process_settings, palette_colors)
+
+def _process_image_file_worker(image_path: str, settings_data: Dict[str, Any], palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Punto de entrada en el proceso hijo para imágenes guardadas en disco.
+    """
+    process_settings = PixelArtProcessSettings(**settings_data)
+    return ImageProcessingService().process_image(image_path, process_settings, palette_colors)
+
 class ImageProcessingService:
     def __init__(self):
         # This ensures we have access to the application settings
@@ -27,21 +87,115 @@ class ImageProcessingService:
         Returns:
             Diccionario con información de la imagen procesada o None si ocurre un error
         """
+        logger.info(f"Processing image: {image_path}")
+        return self._process(image_path, process_settings, palette_colors)
+    
+    def process_image_bytes(self, image_data: Union[bytes, BinaryIO], process_settings: PixelArtProcessSettings, palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Procesa una imagen recibida en memoria, sin escribirla antes en disco.
+        
+        Args:
+            image_data: Bytes de la imagen o un objeto tipo archivo (BytesIO)
+            process_settings: Configuraciones de procesamiento
+            palette_colors: Lista de colores hexadecimales para la paleta
+            
+        Returns:
+            Diccionario con información de la imagen procesada o None si ocurre un error
+        """
+        if isinstance(image_data, bytes):
+            image_data = io.BytesIO(image_data)
+        logger.info("Processing in-memory image")
+        return self._process(image_data, process_settings, palette_colors)
+    
+    async def process_image_async(self, image_path: str, process_settings: PixelArtProcessSettings, palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Procesa una imagen en disco en el pool de procesos sin bloquear el event loop.
+        
+        Args:
+            image_path: Ruta a la imagen a procesar
+            process_settings: Configuraciones de procesamiento
+            palette_colors: Lista de colores hexadecimales para la paleta
+            
+        Returns:
+            Diccionario con información de la imagen procesada o None si ocurre un error
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_process_pool(),
+            _process_image_file_worker,
+            image_path,
+            process_settings.model_dump(),
+            list(palette_colors)
+        )
+    
+    async def process_image_bytes_async(self, image_data: bytes, process_settings: PixelArtProcessSettings, palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Procesa una imagen en memoria en el pool de procesos sin bloquear el event loop.
+        
+        Args:
+            image_data: Bytes de la imagen
+            process_settings: Configuraciones de procesamiento
+            palette_colors: Lista de colores hexadecimales para la paleta
+            
+        Returns:
+            Diccionario con información de la imagen procesada o None si ocurre un error
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            _get_process_pool(),
+            _process_image_bytes_worker,
+            image_data,
+            process_settings.model_dump(),
+            list(palette_colors)
+        )
+    
+    def _process(self, source: Union[str, BinaryIO], process_settings: PixelArtProcessSettings, palette_colors: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Aplica el procesamiento de pixel art a una ruta o a un objeto tipo archivo.
+        """
         try:
-            logger.info(f"Processing image: {image_path}")
             logger.info(f"Using pixel size: {process_settings.pixelSize}")
             logger.info(f"Using palette with {len(palette_colors)} colors")
             
+            # Los archivos de salida se nombran por el contenido (imagen + ajustes + paleta):
+            # si ya existen, la misma petición se procesó antes y se reutilizan tal cual
+            cache_key = self._cache_key(source, process_settings, palette_colors)
+            output_path = os.path.join(_PROCESSED_CACHE_FOLDER, f"pixelart_{cache_key}.png")
+            thumb_path = os.path.join(_PROCESSED_CACHE_FOLDER, f"thumb_{cache_key}.png")
+            
+            if os.path.exists(output_path) and os.path.exists(thumb_path):
+                logger.info(f"Reusing cached pixel art: {output_path}")
+                try:
+                    # La salida conserva el tamaño original, así que el de la imagen reducida se
+                    # obtiene exactamente con el mismo cálculo que al procesarla
+                    with Image.open(output_path) as cached:
+                        w, h = cached.size
+                    result = self._request_outputs(
+                        output_path,
+                        thumb_path,
+                        max(1, w // process_settings.pixelSize),
+                        max(1, h // process_settings.pixelSize)
+                    )
+                    # Marcar como usados: la limpieza elimina primero los más antiguos
+                    os.utime(output_path)
+                    os.utime(thumb_path)
+                    return result
+                except FileNotFoundError:
+                    # Eliminados por la limpieza de la caché entre la comprobación y el enlace
+                    logger.info(f"Cached pixel art evicted, processing again: {output_path}")
+            
             # Abrir la imagen
-            image = Image.open(image_path).convert("RGBA")
+            image = Image.open(source).convert("RGBA")
             
-            # Ajustar contraste
+            # Ajustar contraste y nitidez (con factor 1.0 el realce devuelve la misma imagen,
+            # así que se omite la pasada sobre todos los píxeles)
             contrast_factor = process_settings.contrast / 50  # Normalizar a un factor (0.5-1.5)
-            image = ImageEnhance.Contrast(image).enhance(contrast_factor)
+            if abs(contrast_factor - 1.0) > 1e-3:
+                image = ImageEnhance.Contrast(image).enhance(contrast_factor)
             
-            # Ajustar nitidez
             sharpness_factor = process_settings.sharpness / 50  # Normalizar a un factor (0.5-1.5)
-            image = ImageEnhance.Sharpness(image).enhance(sharpness_factor)
+            if abs(sharpness_factor - 1.0) > 1e-3:
+                image = ImageEnhance.Sharpness(image).enhance(sharpness_factor)
             
             # Reducir a la resolución de pixel art
             w, h = image.size
@@ -51,15 +205,20 @@ class ImageProcessingService:
             new_w = max(1, w // pixel_size)
             new_h = max(1, h // pixel_size)
             
-            # Redimensionar para "pixelar"
-            pixelated = image.resize((new_w, new_h), Image.NEAREST)
-            
-            # Redimensionar de vuelta al tamaño original
-            pixelated = pixelated.resize((w, h), Image.NEAREST)
+            # Reducir con un filtro de caja (media de cada bloque de pixel_size x pixel_size)
+            # sobre el área que cubren los bloques completos; en alfa premultiplicado para que
+            # el color de los píxeles transparentes no tiña los bordes
+            box = (0, 0, min(w, new_w * pixel_size), min(h, new_h * pixel_size))
+            small = image.convert("RGBa").reduce(pixel_size, box=box).convert("RGBA")
             
-            # Aplicar paleta de colores
+            # Aplicar paleta de colores a la imagen reducida: el mapeo es píxel a píxel y el
+            # reescalado NEAREST solo replica píxeles, así que el resultado es el mismo con
+            # pixelSize² veces menos píxeles que mapear
             if palette_colors:
-                pixelated = self._apply_color_palette(pixelated, palette_colors)
+                small = self._apply_color_palette(small, palette_colors)
+            
+            # Redimensionar de vuelta al tamaño original
+            pixelated = small.resize((w, h), Image.NEAREST)
             
             # Manejar fondo
             if process_settings.backgroundType == BackgroundType.TRANSPARENT:
@@ -67,18 +226,14 @@ class ImageProcessingService:
                 if pixelated.mode != 'RGBA':
                     pixelated = pixelated.convert('RGBA')
             
-            # Generar nombre para la imagen de salida
-            timestamp = int(time.time())
-            output_filename = f"pixelart_{timestamp}.png"
-            
             # Make sure the settings.RESULTS_FOLDER path exists
             os.makedirs(settings.RESULTS_FOLDER, exist_ok=True)
+            os.makedirs(_PROCESSED_CACHE_FOLDER, exist_ok=True)
             
-            output_path = os.path.join(settings.RESULTS_FOLDER, output_filename)
             logger.info(f"Saving pixelated image to: {output_path}")
             
             # Guardar imagen
-            pixelated.save(output_path, "PNG")
+            self._save_png(pixelated, output_path)
             
             # Si es animada, crear la animación
             if process_settings.animationType != AnimationType.NONE:
@@ -90,17 +245,12 @@ class ImageProcessingService:
             thumb_size = (150, 150)
             thumbnail = pixelated.copy()
             thumbnail.thumbnail(thumb_size)
-            thumb_filename = f"thumb_{timestamp}.png"
-            thumb_path = os.path.join(settings.RESULTS_FOLDER, thumb_filename)
-            thumbnail.save(thumb_path, "PNG")
+            self._save_png(thumbnail, thumb_path)
             
             # Return the relative URL paths for the frontend
-            return {
-                "image_url": f"/images/results/{output_filename}",
-                "thumbnail_url": f"/images/results/{thumb_filename}",
-                "width": new_w,
-                "height": new_h
-            }
+            result = self._request_outputs(output_path, thumb_path, new_w, new_h)
+            prune_cache_folder(_PROCESSED_CACHE_FOLDER, settings.PROCESSED_FILE_CACHE_MAX_BYTES)
+            return result
             
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
@@ -108,6 +258,54 @@ class ImageProcessingService:
             logger.error(traceback.format_exc())
             return None
     
+    def _request_outputs(self, output_path: str, thumb_path: str, width: int, height: int) -> Dict[str, Any]:
+        """
+        Entrega a la petición sus propios archivos (enlaces duros a los de la caché): la
+        subida a Cloudinary o el borrado del pixel art eliminan esos archivos sin afectar
+        a la caché ni a otras peticiones con el mismo contenido.
+        """
+        request_id = uuid.uuid4().hex
+        output_filename = f"pixelart_{request_id}.png"
+        thumb_filename = f"thumb_{request_id}.png"
+        link_or_copy(output_path, os.path.join(settings.RESULTS_FOLDER, output_filename))
+        link_or_copy(thumb_path, os.path.join(settings.RESULTS_FOLDER, thumb_filename))
+        
+        return {
+            "image_url": f"/images/results/{output_filename}",
+            "thumbnail_url": f"/images/results/{thumb_filename}",
+            "width": width,
+            "height": height
+        }
+    
+    def _cache_key(self, source: Union[str, BinaryIO], process_settings: PixelArtProcessSettings, palette_colors: List[str]) -> str:
+        """
+        Hash BLAKE2 de la imagen de origen, los ajustes y la paleta (nombre de los archivos de salida).
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                        digest.update(mapped)
+        elif isinstance(source, io.BytesIO):
+            digest.update(source.getbuffer())
+        else:
+            digest.update(source.read())
+            source.seek(0)
+        digest.update(_OUTPUT_VERSION)
+        digest.update(process_settings.model_dump_json().encode())
+        digest.update(",".join(palette_colors).encode())
+        return digest.hexdigest()
+    
+    def _save_png(self, image: Image.Image, path: str):
+        """
+        Guarda la imagen en un archivo temporal y lo renombra: una petición concurrente
+        nunca ve (ni reutiliza) un PNG a medio escribir.
+        """
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp_path, "PNG")
+        os.replace(tmp_path, path)
+    
     def _apply_color_palette(self, image: Image.Image, palette_colors: List[str]) -> Image.Image:
         """
         Aplica una paleta de colores específica a la imagen.
@@ -123,36 +321,20 @@ class ImageProcessingService:
             # Convertir colores hex a RGB
             rgb_palette = [self._hex_to_rgb(color) for color in palette_colors]
             
-            # Convertir la imagen a numpy array
-            img_array = np.array(image)
-            
-            # Extraer los canales
-            if img_array.shape[2] == 4:  # RGBA
-                r, g, b, a = img_array[:, :, 0], img_array[:, :, 1], img_array[:, :, 2], img_array[:, :, 3]
-            else:  # RGB
-                r, g, b = img_array[:, :, 0], img_array[:, :, 1], img_array[:, :, 2]
-                a = None
-            
-            # Crear una nueva imagen con los colores más cercanos de la paleta
-            height, width = img_array.shape[:2]
-            new_img = np.zeros((height, width, 4 if a is not None else 3), dtype=np.uint8)
-            
-            # Para cada píxel, encontrar el color más cercano en la paleta
-            for y in range(height):
-                for x in range(width):
-                    if a is not None and a[y, x] < 128:
-                        # Si es transparente, mantener la transparencia
-                        new_img[y, x] = [0, 0, 0, 0]
-                        continue
-                    
-                    # Convert to int to avoid overflow issues
-                    pixel = [int(r[y, x]), int(g[y, x]), int(b[y, x])]
-                    closest_color = self._find_closest_color(pixel, rgb_palette)
-                    
-                    if a is not None:
-                        new_img[y, x] = [closest_color[0], closest_color[1], closest_color[2], a[y, x]]
-                    else:
-                        new_img[y, x] = closest_color
+            # Color más cercano de la paleta para cada píxel: PIL lo resuelve en C
+            # (hasta 256 colores); para paletas mayores se usa NumPy
+            if len(rgb_palette) <= 256:
+                new_rgb = np.array(self._quantize_to_palette(image, rgb_palette))
+            else:
+                new_rgb = self._nearest_palette_colors(np.array(image.convert("RGB")), rgb_palette)
+            
+            if image.mode == "RGBA":
+                # Mantener el alfa original; los píxeles transparentes quedan a [0, 0, 0, 0]
+                alpha = np.array(image.getchannel("A"))
+                new_img = np.dstack((new_rgb, alpha))
+                new_img[alpha < 128] = 0
+            else:
+                new_img = new_rgb
             
             # Convertir de vuelta a imagen PIL
             return Image.fromarray(new_img)
@@ -163,28 +345,38 @@ class ImageProcessingService:
             # Return the original image if there was an error
             return image
     
-    def _hex_to_rgb(self, hex_color: str) -> Tuple[int, int, int]:
-        """Convierte un color hexadecimal a RGB."""
-        hex_color = hex_color.lstrip('#')
-        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
+    def _quantize_to_palette(self, image: Image.Image, rgb_palette: List[Tuple[int, int, int]]) -> Image.Image:
+        """
+        Cuantiza la imagen a la paleta con Image.quantize (sin tramado) y la devuelve en RGB.
+        """
+        # La tabla de paleta tiene 256 entradas: se rellena repitiendo el primer color
+        # para que las entradas vacías (negro) no puedan elegirse
+        padding = [rgb_palette[0]] * (256 - len(rgb_palette))
+        palette_image = Image.new("P", (1, 1))
+        palette_image.putpalette([channel for color in rgb_palette + padding for channel in color])
+        
+        return image.convert("RGB").quantize(palette=palette_image, dither=Image.Dither.NONE).convert("RGB")
     
-    def _find_closest_color(self, pixel: List[int], palette: List[Tuple[int, int, int]]) -> Tuple[int, int, int]:
-        """Encuentra el color más cercano en la paleta."""
-        min_distance = float('inf')
-        closest = palette[0]  # Default to first color
+    def _nearest_palette_colors(self, rgb: np.ndarray, rgb_palette: List[Tuple[int, int, int]]) -> np.ndarray:
+        """
+        Sustituye cada píxel por el color de la paleta más cercano (distancia euclídea)
+        con NumPy, por bloques de filas para acotar el temporal (filas, W, K, 3).
+        """
+        palette = np.array(rgb_palette, dtype=np.int32)
+        rgb = rgb.astype(np.int32)
+        height, width = rgb.shape[:2]
         
-        for color in palette:
-            # Calculate Euclidean distance, safely
-            try:
-                # Use a safer way to calculate distance
-                distance = sum(((p - c) ** 2) for p, c in zip(pixel, color))
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    closest = color
-            except Exception as e:
-                logger.error(f"Error calculating color distance: {str(e)}")
-                # If there's an error, just continue with the next color
-                continue
-                
-        return closest
\ No newline at end of file
+        indices = np.empty((height, width), dtype=np.intp)
+        rows_per_chunk = max(1, _PALETTE_CHUNK_ELEMENTS // (width * len(palette)))
+        for top in range(0, height, rows_per_chunk):
+            diff = rgb[top:top + rows_per_chunk, :, None, :] - palette[None, None, :, :]
+            indices[top:top + rows_per_chunk] = np.einsum("hwkc,hwkc->hwk", diff, diff).argmin(axis=2)
+        
+        return palette.astype(np.uint8)[indices]
+    
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def _hex_to_rgb(hex_color: str) -> Tuple[int, int, int]:
+        """Convierte un color hexadecimal a RGB (memorizado: las paletas se repiten en cada imagen)."""
+        hex_color = hex_color.lstrip('#')
+        return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
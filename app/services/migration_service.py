@@ -1,160 +1,233 @@
+import asyncio
 import logging
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, List
+from pymongo import UpdateOne
+from sqlalchemy import func, select, text
 from sqlalchemy.orm import Session
-from app.database.mongodb import sync_pixel_arts_collection, sync_palettes_collection, sync_user_settings_collection
+from app.database.mongodb import pixel_arts_collection, palettes_collection, user_settings_collection
 from app.database.models import DBPixelArt, DBColorPalette, DBUserSettings
 
 logger = logging.getLogger(__name__)
 
+# Tamaño de lote por defecto para las escrituras en MongoDB
+DEFAULT_BATCH_SIZE = 5000
+
+# PRAGMAs de lectura para SQLite durante la migración (caché de 256 MB y mmap de 256 MB);
+# al terminar se restauran los valores anteriores de la conexión
+_SQLITE_READ_PRAGMAS = (
+    ("cache_size", -262144),
+    ("mmap_size", 268435456),
+)
+
+# Columnas que se copian de cada tabla (se leen como filas ligeras, sin instanciar el ORM;
+# las etiquetas coinciden con los nombres de campo de los documentos de MongoDB)
+_PALETTE_COLUMNS = (
+    DBColorPalette.id, DBColorPalette.name, DBColorPalette.colors, DBColorPalette.description,
+    DBColorPalette.createdAt, DBColorPalette.updatedAt,
+)
+_PIXEL_ART_COLUMNS = (
+    DBPixelArt.id, DBPixelArt.name, DBPixelArt.imageUrl, DBPixelArt.thumbnailUrl,
+    DBPixelArt.width, DBPixelArt.height, DBPixelArt.pixelSize, DBPixelArt.style,
+    DBPixelArt.backgroundType, DBPixelArt.animationType, DBPixelArt.isAnimated,
+    DBPixelArt.paletteId, DBPixelArt.tags, DBPixelArt.description,
+    DBPixelArt.createdAt, DBPixelArt.updatedAt, DBPixelArt.cloudinaryPublicId,
+)
+_USER_SETTINGS_COLUMNS = (
+    DBUserSettings.userId, DBUserSettings.pixelSize, DBUserSettings.defaultStyle,
+    DBUserSettings.defaultPalette, DBUserSettings.contrast, DBUserSettings.sharpness,
+    DBUserSettings.defaultBackground, DBUserSettings.defaultAnimationType, DBUserSettings.theme,
+    DBUserSettings.createdAt, DBUserSettings.updatedAt,
+)
+
 class MigrationService:
     """Servicio para migrar datos desde SQLite a MongoDB"""
     
     @staticmethod
-    def migrate_palettes(db: Session):
+    @contextmanager
+    def _sqlite_read_tuning(db: Session):
+        """
+        Ajusta la conexión SQLite para lecturas masivas mientras dura el bloque (no aplica a
+        otros motores). La conexión vuelve después al pool, así que al salir se restauran
+        los valores anteriores para no dejar una caché de 256 MB a las demás peticiones.
+        """
+        if db.get_bind().dialect.name != "sqlite":
+            yield
+            return
+        previous = [(name, db.execute(text(f"PRAGMA {name}")).scalar()) for name, _ in _SQLITE_READ_PRAGMAS]
+        for name, value in _SQLITE_READ_PRAGMAS:
+            db.execute(text(f"PRAGMA {name}={int(value)}"))
+        try:
+            yield
+        finally:
+            for name, value in previous:
+                db.execute(text(f"PRAGMA {name}={int(value)}"))
+    
+    @staticmethod
+    async def _stream_documents(db: Session, columns, batch_size: int, fix_document=None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        Lee las columnas indicadas de SQLite por lotes (yield_per) y devuelve cada fila
+        como documento (dict(row._mapping)), sin cargar toda la tabla en memoria ni
+        crear objetos del ORM. Las lecturas se hacen en un hilo.
+        """
+        result = await asyncio.to_thread(
+            db.execute, select(*columns).execution_options(yield_per=batch_size)
+        )
+        partitions = result.partitions()
+        while True:
+            rows = await asyncio.to_thread(next, partitions, None)
+            if rows is None:
+                return
+            documents = [dict(row._mapping) for row in rows]
+            if fix_document is not None:
+                for document in documents:
+                    fix_document(document)
+            yield documents
+    
+    @staticmethod
+    async def _count_rows(db: Session, model) -> int:
+        """
+        Cuenta las filas de una tabla con SELECT COUNT(*) (para informar del progreso).
+        """
+        result = await asyncio.to_thread(db.execute, select(func.count()).select_from(model))
+        return result.scalar_one()
+    
+    @staticmethod
+    async def _bulk_upsert_iter(collection, key: str, batches: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[Dict[str, int]]:
+        """
+        Inserta o actualiza en MongoDB cada lote de documentos con bulk_write,
+        devolviendo el progreso acumulado después de cada lote.
+        """
+        processed = 0
+        count = 0
+        async for batch in batches:
+            result = await collection.bulk_write(
+                [UpdateOne({key: doc[key]}, {"$set": doc}, upsert=True) for doc in batch],
+                ordered=False
+            )
+            processed += len(batch)
+            count += result.upserted_count + result.modified_count
+            yield {"processed": processed, "migrated": count}
+    
+    @staticmethod
+    async def _migrate(db: Session, columns, collection, key: str, batch_size: int, fix_document=None) -> Dict[str, int]:
+        """
+        Migra una tabla completa de SQLite a una colección de MongoDB por lotes.
+        
+        Returns:
+            Progreso final: {"processed": filas leídas, "migrated": documentos insertados o modificados}
+        """
+        progress = {"processed": 0, "migrated": 0}
+        with MigrationService._sqlite_read_tuning(db):
+            batches = MigrationService._stream_documents(db, columns, batch_size, fix_document)
+            async for progress in MigrationService._bulk_upsert_iter(collection, key, batches):
+                pass
+        return progress
+    
+    @staticmethod
+    def _fix_pixel_art_document(document: Dict[str, Any]):
+        """
+        Ajusta un documento de pixel art leído de SQLite (las etiquetas nunca son nulas en MongoDB)
+        """
+        if document["tags"] is None:
+            document["tags"] = []
+    
+    @staticmethod
+    async def migrate_palettes(db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
         """
         Migra todas las paletas de colores desde SQLite a MongoDB
         """
         try:
-            # Obtener todas las paletas de SQLite
-            sqlite_palettes = db.query(DBColorPalette).all()
-            
-            # Contar paletas migradas
-            count = 0
+            # Insertar en MongoDB por lotes (upsert para evitar duplicados)
+            progress = await MigrationService._migrate(
+                db, _PALETTE_COLUMNS, palettes_collection, "id", batch_size
+            )
             
-            for palette in sqlite_palettes:
-                # Convertir a diccionario para MongoDB
-                palette_dict = {
-                    "id": palette.id,
-                    "name": palette.name,
-                    "colors": palette.colors,
-                    "description": palette.description,
-                    "createdAt": palette.createdAt,
-                    "updatedAt": palette.updatedAt
-                }
-                
-                # Insertar en MongoDB (update_one con upsert=True para evitar duplicados)
-                result = sync_palettes_collection.update_one(
-                    {"id": palette.id},
-                    {"$set": palette_dict},
-                    upsert=True
-                )
-                
-                if result.upserted_id or result.modified_count > 0:
-                    count += 1
-            
-            logger.info(f"Migración completada: {count}/{len(sqlite_palettes)} paletas migradas a MongoDB")
-            return count
+            logger.info(f"Migración completada: {progress['migrated']}/{progress['processed']} paletas migradas a MongoDB")
+            return progress["migrated"]
         
         except Exception as e:
             logger.error(f"Error durante la migración de paletas: {str(e)}")
             return 0
     
     @staticmethod
-    def migrate_pixel_arts(db: Session):
+    async def migrate_pixel_arts(db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
         """
         Migra todas las imágenes de pixel art desde SQLite a MongoDB
         """
         try:
-            # Obtener todos los pixel arts de SQLite
-            sqlite_pixel_arts = db.query(DBPixelArt).all()
+            # Insertar en MongoDB por lotes (upsert para evitar duplicados)
+            progress = await MigrationService._migrate(
+                db, _PIXEL_ART_COLUMNS, pixel_arts_collection, "id", batch_size,
+                MigrationService._fix_pixel_art_document
+            )
             
-            # Contar pixel arts migrados
-            count = 0
-            
-            for pixel_art in sqlite_pixel_arts:
-                # Convertir a diccionario para MongoDB
-                pixel_art_dict = {
-                    "id": pixel_art.id,
-                    "name": pixel_art.name,
-                    "imageUrl": pixel_art.imageUrl,
-                    "thumbnailUrl": pixel_art.thumbnailUrl,
-                    "width": pixel_art.width,
-                    "height": pixel_art.height,
-                    "pixelSize": pixel_art.pixelSize,
-                    "style": pixel_art.style,
-                    "backgroundType": pixel_art.backgroundType,
-                    "animationType": pixel_art.animationType,
-                    "isAnimated": pixel_art.isAnimated,
-                    "paletteId": pixel_art.paletteId,
-                    "tags": pixel_art.tags or [],
-                    "description": pixel_art.description,
-                    "createdAt": pixel_art.createdAt,
-                    "updatedAt": pixel_art.updatedAt,
-                    "cloudinaryPublicId": getattr(pixel_art, "cloudinaryPublicId", None)
-                }
-                
-                # Insertar en MongoDB (update_one con upsert=True para evitar duplicados)
-                result = sync_pixel_arts_collection.update_one(
-                    {"id": pixel_art.id},
-                    {"$set": pixel_art_dict},
-                    upsert=True
-                )
-                
-                if result.upserted_id or result.modified_count > 0:
-                    count += 1
-            
-            logger.info(f"Migración completada: {count}/{len(sqlite_pixel_arts)} pixel arts migrados a MongoDB")
-            return count
+            logger.info(f"Migración completada: {progress['migrated']}/{progress['processed']} pixel arts migrados a MongoDB")
+            return progress["migrated"]
         
         except Exception as e:
             logger.error(f"Error durante la migración de pixel arts: {str(e)}")
             return 0
     
     @staticmethod
-    def migrate_user_settings(db: Session):
+    async def migrate_user_settings(db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
         """
         Migra todas las configuraciones de usuario desde SQLite a MongoDB
         """
         try:
-            # Obtener todas las configuraciones de usuario de SQLite
-            sqlite_settings = db.query(DBUserSettings).all()
-            
-            # Contar configuraciones migradas
-            count = 0
-            
-            for settings in sqlite_settings:
-                # Convertir a diccionario para MongoDB
-                settings_dict = {
-                    "userId": settings.userId,
-                    "pixelSize": settings.pixelSize,
-                    "defaultStyle": settings.defaultStyle,
-                    "defaultPalette": settings.defaultPalette,
-                    "contrast": settings.contrast,
-                    "sharpness": settings.sharpness,
-                    "defaultBackground": settings.defaultBackground,
-                    "defaultAnimationType": settings.defaultAnimationType,
-                    "theme": settings.theme,
-                    "createdAt": settings.createdAt,
-                    "updatedAt": settings.updatedAt
-                }
-                
-                # Insertar en MongoDB (update_one con upsert=True para evitar duplicados)
-                result = sync_user_settings_collection.update_one(
-                    {"userId": settings.userId},
-                    {"$set": settings_dict},
-                    upsert=True
-                )
-                
-                if result.upserted_id or result.modified_count > 0:
-                    count += 1
+            # Insertar en MongoDB por lotes (upsert para evitar duplicados)
+            progress = await MigrationService._migrate(
+                db, _USER_SETTINGS_COLUMNS, user_settings_collection, "userId", batch_size
+            )
             
-            logger.info(f"Migración completada: {count}/{len(sqlite_settings)} configuraciones de usuario migradas a MongoDB")
-            return count
+            logger.info(f"Migración completada: {progress['migrated']}/{progress['processed']} configuraciones de usuario migradas a MongoDB")
+            return progress["migrated"]
         
         except Exception as e:
             logger.error(f"Error durante la migración de configuraciones de usuario: {str(e)}")
             return 0
     
     @staticmethod
-    def migrate_all_data(db: Session):
+    async def migrate_all_data(db: Session, batch_size: int = DEFAULT_BATCH_SIZE):
         """
         Migra todos los datos desde SQLite a MongoDB
         """
-        palette_count = MigrationService.migrate_palettes(db)
-        pixel_art_count = MigrationService.migrate_pixel_arts(db)
-        settings_count = MigrationService.migrate_user_settings(db)
+        palette_count = await MigrationService.migrate_palettes(db, batch_size)
+        pixel_art_count = await MigrationService.migrate_pixel_arts(db, batch_size)
+        settings_count = await MigrationService.migrate_user_settings(db, batch_size)
         
         return {
             "palettes": palette_count,
             "pixel_arts": pixel_art_count,
             "user_settings": settings_count
-        }
\ No newline at end of file
+        }
+    
+    @staticmethod
+    async def migrate_all_data_iter(db: Session, batch_size: int = DEFAULT_BATCH_SIZE) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Migra todos los datos desde SQLite a MongoDB, devolviendo un evento de
+        progreso por cada lote escrito: {"entity", "processed", "migrated", "total"}
+        """
+        entities = (
+            ("palettes", DBColorPalette, _PALETTE_COLUMNS, None, palettes_collection, "id"),
+            ("pixel_arts", DBPixelArt, _PIXEL_ART_COLUMNS, MigrationService._fix_pixel_art_document, pixel_arts_collection, "id"),
+            ("user_settings", DBUserSettings, _USER_SETTINGS_COLUMNS, None, user_settings_collection, "userId"),
+        )
+        
+        with MigrationService._sqlite_read_tuning(db):
+            for entity, model, columns, fix_document, collection, key in entities:
+                try:
+                    total = await MigrationService._count_rows(db, model)
+                    
+                    if not total:
+                        yield {"entity": entity, "processed": 0, "migrated": 0, "total": 0}
+                        continue
+                    
+                    batches = MigrationService._stream_documents(db, columns, batch_size, fix_document)
+                    async for progress in MigrationService._bulk_upsert_iter(collection, key, batches):
+                        yield {"entity": entity, **progress, "total": total}
+                
+                except Exception as e:
+                    logger.error(f"Error durante la migración de {entity}: {str(e)}")
+                    yield {"entity": entity, "error": str(e)}
+                    return
@@ -1,23 +1,416 @@
 #app/services/openai_service.py
 import os
+import re
+import json
 import time
+import uuid
+import asyncio
+import hashlib
+import mmap
+import threading
+from functools import lru_cache
 import httpx
 import base64
-from openai import OpenAI
+import aiofiles
+from io import BytesIO
+from PIL import Image
+from openai import AsyncOpenAI, APIConnectionError, BadRequestError, InternalServerError, RateLimitError
+from cachetools import TTLCache
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential_jitter
 from app.config import settings as app_settings
+from app.utils.image_utils import link_or_copy, prune_cache_folder
 from app.models.pixel_art import PixelArtStyle, BackgroundType, AnimationType, PixelArtProcessSettings
 import logging
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple, Union, Callable, Awaitable
 
 logger = logging.getLogger(__name__)
 
+# Tamaño de bloque para descargar las imágenes generadas (64 KB)
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Las imágenes de más de 1 MB se reducen a 1024 px de lado antes de enviarlas a GPT-4o
+VISION_MAX_BYTES = 1024 * 1024
+VISION_MAX_EDGE = 1024
+
+# Semáforo que limita las llamadas concurrentes a OpenAI. Se crea en el primer uso para
+# quedar ligado al event loop en ejecución.
+_openai_semaphore: Optional[asyncio.Semaphore] = None
+
+def _get_openai_semaphore() -> asyncio.Semaphore:
+    global _openai_semaphore
+    if _openai_semaphore is None:
+        _openai_semaphore = asyncio.Semaphore(app_settings.OPENAI_MAX_CONCURRENCY)
+    return _openai_semaphore
+
+# Errores transitorios de OpenAI que merece la pena reintentar (APITimeoutError es un
+# APIConnectionError). Un prompt rechazado (BadRequestError) no se reintenta.
+_RETRYABLE_OPENAI_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+@retry(
+    retry=retry_if_exception_type(_RETRYABLE_OPENAI_ERRORS),
+    stop=stop_after_attempt(app_settings.OPENAI_RETRY_ATTEMPTS),
+    wait=wait_exponential_jitter(initial=1, max=20),
+    reraise=True
+)
+async def _limited(call, **kwargs):
+    """
+    Ejecuta una llamada a la API de OpenAI ocupando un hueco del semáforo solo mientras
+    dura la petición (las descargas y el acceso a disco no cuentan para el límite).
+    Los errores transitorios se reintentan con espera exponencial y jitter, sin ocupar
+    el semáforo durante la espera.
+    """
+    async with _get_openai_semaphore():
+        return await call(**kwargs)
+
+# Tablas para construir los prompts (se crean una sola vez, no en cada llamada)
+_STYLE_INFO = {
+    PixelArtStyle.RETRO_8BIT: "retro 8-bit NES-style",
+    PixelArtStyle.MODERN_16BIT: "16-bit SNES-style",
+    PixelArtStyle.MINIMALIST: "minimalist",
+    PixelArtStyle.DITHERED: "dithered",
+    PixelArtStyle.ISOMETRIC: "isometric"
+}
+
+_PALETTE_COLORS = {
+    'gameboy': ("#0f380f", "#306230", "#8bac0f", "#9bbc0f"),
+    'nes': ("#000000", "#fcfcfc", "#f8f8f8", "#bcbcbc", "#7c7c7c", "#a4000c"),
+    'cga': ("#000000", "#555555", "#aaaaaa", "#ffffff", "#0000aa", "#5555ff"),
+    'pico8': ("#000000", "#1D2B53", "#7E2553", "#008751", "#AB5236", "#5F574F"),
+    'moody': ("#5e315b", "#8c3f5d", "#ba6156", "#f2a65a")
+}
+_DEFAULT_PALETTE_COLORS = ("#000000", "#333333", "#777777", "#ffffff")
+
+# Colores de cada paleta ya unidos tal como aparecen en el prompt
+_PALETTE_COLOR_CODES = {palette_id: " ".join(colors) for palette_id, colors in _PALETTE_COLORS.items()}
+_DEFAULT_COLOR_CODES = " ".join(_DEFAULT_PALETTE_COLORS)
+
+_BACKGROUND_INFO = {
+    BackgroundType.TRANSPARENT: "transparent",
+    BackgroundType.SOLID: "simple solid color",
+    BackgroundType.GRADIENT: "subtle gradient",
+    BackgroundType.PATTERN: "simple pattern"
+}
+
+# Términos que no deben aparecer en el prompt (DALL-E dibuja muestras de color), en una sola pasada
+_SANITIZE_MAP = {"color scheme display": "", "palette": "colors", "swatch": "colors"}
+_SANITIZE_RE = re.compile("|".join(re.escape(term) for term in _SANITIZE_MAP))
+
+@lru_cache(maxsize=2048)
+def _build_prompt(prompt: str, style: PixelArtStyle, pixel_scale: int, palette_id: str, background_type: BackgroundType) -> str:
+    """
+    Construye el prompt de DALL-E para un prompt de usuario y unos ajustes. Es una función
+    pura de sus argumentos, así que se memoriza (los reintentos repiten las mismas entradas).
+    """
+    # Obtener detalles del estilo pixel art solicitado
+    style_info = _STYLE_INFO.get(style, "classic")
+    
+    # Obtener colores de la paleta
+    color_codes = _PALETTE_COLOR_CODES.get(palette_id, _DEFAULT_COLOR_CODES)
+    
+    # Obtener información sobre el fondo
+    background_info = _BACKGROUND_INFO.get(background_type, "simple")
+    
+    # Crear una descripción compacta y específica
+    background_directive = "transparent background" if background_type == BackgroundType.TRANSPARENT else background_info
+
+    # Prompt principal - evitando mencionar "paletas" o cualquier cosa relacionada con swatches
+    main_prompt = f"Create a {style_info} pixel art character of a {prompt}, with {pixel_scale}x{pixel_scale} pixel blocks, on a {background_directive}. Color scheme: {color_codes}. Character only, no text, no UI elements."
+    
+    # Verificación adicional para asegurarse de que el prompt no mencione paletas
+    return _SANITIZE_RE.sub(lambda match: _SANITIZE_MAP[match.group(0)], main_prompt)
+
+def _vision_image_url(image_bytes: Union[bytes, mmap.mmap]) -> str:
+    """
+    Prepara la imagen para el análisis con GPT-4o como data URI en base64. Las imágenes
+    de más de VISION_MAX_BYTES se reducen antes a VISION_MAX_EDGE píxeles de lado: el modelo
+    las reescala de todos modos y así se envía mucho menos. Acepta también un mmap del
+    archivo, que se decodifica y codifica sin copiarlo antes a bytes.
+    """
+    if len(image_bytes) > VISION_MAX_BYTES:
+        source = image_bytes if isinstance(image_bytes, mmap.mmap) else BytesIO(image_bytes)
+        with Image.open(source) as img:
+            if max(img.size) > VISION_MAX_EDGE:
+                img.thumbnail((VISION_MAX_EDGE, VISION_MAX_EDGE), Image.LANCZOS)
+                buffer = BytesIO()
+                img.save(buffer, "PNG")
+                image_bytes = buffer.getvalue()
+    return f"data:image/png;base64,{base64.b64encode(image_bytes).decode('utf-8')}"
+
+@lru_cache(maxsize=16)
+def _vision_image_url_for_file(path: str, mtime_ns: int, size: int) -> str:
+    """
+    Igual que _vision_image_url para un archivo; memorizada por (ruta, mtime, tamaño)
+    para que las ediciones repetidas de la misma imagen no la vuelvan a leer y codificar.
+    El archivo se mapea en memoria en lugar de leerlo entero (se llama desde un hilo).
+    """
+    with open(path, "rb") as f:
+        if size == 0:
+            return _vision_image_url(b"")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _vision_image_url(mm)
+
+# Caché de imágenes generadas por DALL-E, por (prompt, modelo, tamaño, calidad). En disco
+# la propia imagen, nombrada con la clave (sobrevive a reinicios; fuera de la carpeta que se
+# sirve, cada petición recibe su copia en RESULTS_FOLDER); en memoria sus dimensiones, para
+# no volver a abrirla. Las llamadas síncronas se ejecutan en hilos, así que el acceso va
+# protegido con un lock.
+_GENERATION_CACHE_FOLDER = os.path.join(app_settings.CACHE_FOLDER, "generations")
+_generation_cache = TTLCache(maxsize=1024, ttl=app_settings.OPENAI_GENERATION_CACHE_TTL_SECONDS)
+_generation_cache_lock = threading.Lock()
+
+# Caché de los análisis de imagen de GPT-4o (imagen + instrucciones -> descripción).
+# Solo se accede desde el event loop, así que no necesita lock.
+_vision_cache = TTLCache(maxsize=1024, ttl=app_settings.OPENAI_VISION_CACHE_TTL_SECONDS)
+
+def _generation_key(prompt: str, quality: str, model: str = "dall-e-3", size: str = "1024x1024") -> str:
+    """
+    Clave estable de una generación de DALL-E (hash de sus parámetros).
+    """
+    payload = json.dumps({"p": prompt, "m": model, "s": size, "q": quality}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
 class OpenAIService:
     def __init__(self):
-        self.client = OpenAI(api_key=app_settings.OPENAI_API_KEY)
+        # Sin los reintentos propios del SDK: los hace _limited (si no, se multiplicarían)
+        self.client = AsyncOpenAI(api_key=app_settings.OPENAI_API_KEY, max_retries=0)
+        # Cliente HTTP propio para descargar las imágenes generadas: se reutilizan las conexiones
+        # TLS con el almacenamiento de OpenAI y, con HTTP/2, las descargas simultáneas comparten conexión
+        self._http = httpx.AsyncClient(
+            timeout=httpx.Timeout(60.0),
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+        )
+        # Generaciones en curso por clave de caché (single-flight)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        os.makedirs(app_settings.RESULTS_FOLDER, exist_ok=True)
+        os.makedirs(_GENERATION_CACHE_FOLDER, exist_ok=True)
+    
+    async def aclose(self):
+        """
+        Cierra los clientes de OpenAI y de descargas (se llama al apagar la aplicación).
+        """
+        await self.client.close()
+        await self._http.aclose()
+    
+    @staticmethod
+    def _image_size(path: str) -> Tuple[int, int]:
+        """
+        Lee las dimensiones reales de la imagen guardada (solo la cabecera, sin decodificarla).
+        Si no se puede leer, devuelve el tamaño solicitado a DALL-E (1024x1024).
+        """
+        try:
+            with Image.open(path) as img:
+                return img.size
+        except Exception as e:
+            logger.warning(f"Could not read generated image size: {str(e)}")
+            return 1024, 1024
+    
+    @staticmethod
+    def _generation_result(filename: str, width: int, height: int) -> Dict:
+        """
+        Datos de una imagen generada guardada en RESULTS_FOLDER (con la ruta local para subirla a Cloudinary).
+        """
+        return {
+            "image_url": f"/images/results/{filename}",  # Relative path for the frontend
+            "thumbnail_url": f"/images/results/{filename}",  # Same for thumbnail initially
+            "width": width,
+            "height": height,
+            "local_path": os.path.join(app_settings.RESULTS_FOLDER, filename)
+        }
+    
+    def _cached_generation(self, key: str, prefix: str) -> Optional[Dict]:
+        """
+        Devuelve la imagen ya generada para esta clave si sigue en disco y no ha caducado
+        (la caducada se borra).
+        """
+        if not app_settings.OPENAI_CACHE_GENERATIONS:
+            return None
+        
+        filename = f"{prefix}_{key}.png"
+        path = os.path.join(_GENERATION_CACHE_FOLDER, filename)
+        try:
+            age = time.time() - os.stat(path).st_mtime
+        except OSError:
+            return None
+        if age > app_settings.OPENAI_GENERATION_CACHE_TTL_SECONDS:
+            with _generation_cache_lock:
+                _generation_cache.pop(filename, None)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        
+        with _generation_cache_lock:
+            size = _generation_cache.get(filename)
+        if size is None:
+            size = self._image_size(path)
+            with _generation_cache_lock:
+                _generation_cache[filename] = size
+        
+        logger.info(f"Reusing cached DALL-E image: {path}")
+        try:
+            return self._request_copy(path, prefix, *size)
+        except FileNotFoundError:
+            # Eliminada por la limpieza de la caché entre la comprobación y la copia
+            return None
+    
+    def _request_copy(self, cache_path: str, prefix: str, width: int, height: int) -> Dict:
+        """
+        Copia propia (enlace duro) de una imagen de la caché para esta petición: la subida
+        a Cloudinary borra el archivo local después, y el de la caché debe seguir en disco.
+        """
+        copy_filename = f"{prefix}_{uuid.uuid4().hex}.png"
+        link_or_copy(cache_path, os.path.join(app_settings.RESULTS_FOLDER, copy_filename))
+        return self._generation_result(copy_filename, width, height)
+    
+    async def _describe_image(self, vision_url: str, instructions: str, max_tokens: int, detail: Optional[str] = None) -> str:
+        """
+        Analiza una imagen con GPT-4o (modelo con visión). La descripción se guarda en caché por
+        imagen e instrucciones: los reintentos sobre la misma imagen no repiten la llamada y,
+        con la misma descripción, el prompt de DALL-E coincide y reutiliza la imagen generada.
+        """
+        key = hashlib.sha1(f"{instructions}\0{max_tokens}\0{detail}\0{vision_url}".encode()).hexdigest()
+        description = _vision_cache.get(key)
+        if description is not None:
+            logger.info("Reusing cached image analysis")
+            return description
+        
+        image_url = {"url": vision_url}
+        if detail:
+            image_url["detail"] = detail
         
-    def generate_from_prompt(self, prompt: str, settings: PixelArtProcessSettings) -> Optional[Dict]:
+        response_vision = await _limited(
+            self.client.chat.completions.create,
+            model="gpt-4o",
+            messages=[
+                {
+                    "role": "user",
+                    "content": [
+                        {
+                            "type": "text", 
+                            "text": instructions
+                        },
+                        {
+                            "type": "image_url",
+                            "image_url": image_url
+                        }
+                    ]
+                }
+            ],
+            max_tokens=max_tokens
+        )
+        
+        description = response_vision.choices[0].message.content
+        _vision_cache[key] = description
+        return description
+    
+    @staticmethod
+    def _generation_path(prefix: str, key: Optional[str]) -> str:
+        """
+        Ruta de una imagen generada. Con clave (y la caché activa) va a la caché, nombrada
+        con ella para que la siguiente petición igual la reutilice; si no, a RESULTS_FOLDER
+        con un UUID (dos peticiones en el mismo segundo no se pisan).
+        """
+        if key and app_settings.OPENAI_CACHE_GENERATIONS:
+            return os.path.join(_GENERATION_CACHE_FOLDER, f"{prefix}_{key}.png")
+        return os.path.join(app_settings.RESULTS_FOLDER, f"{prefix}_{uuid.uuid4().hex}.png")
+    
+    def _finish_generation(self, tmp_path: str, path: str, prefix: Optional[str] = None) -> Dict:
+        """
+        Mueve la imagen descargada a su ruta definitiva y, si es de la caché, la registra y
+        limita el tamaño de la caché. Con prefix devuelve una copia propia para la petición.
+        """
+        # Renombrar al final: una petición concurrente nunca ve un archivo a medias
+        os.replace(tmp_path, path)
+        
+        # Real dimensions of the generated image
+        width, height = self._image_size(path)
+        
+        # Sin clave o con la caché desactivada el archivo ya es el de la petición
+        if os.path.dirname(path) != _GENERATION_CACHE_FOLDER:
+            return self._generation_result(os.path.basename(path), width, height)
+        
+        with _generation_cache_lock:
+            _generation_cache[os.path.basename(path)] = (width, height)
+        result = self._request_copy(path, prefix, width, height) if prefix else {
+            "width": width,
+            "height": height,
+            "local_path": path
+        }
+        prune_cache_folder(
+            _GENERATION_CACHE_FOLDER,
+            app_settings.OPENAI_GENERATION_CACHE_MAX_BYTES,
+            max_age=app_settings.OPENAI_GENERATION_CACHE_TTL_SECONDS
+        )
+        return result
+    
+    @retry(
+        retry=retry_if_exception_type(httpx.TransportError),
+        stop=stop_after_attempt(app_settings.OPENAI_RETRY_ATTEMPTS),
+        wait=wait_exponential_jitter(initial=1, max=20),
+        reraise=True
+    )
+    async def _download_generation(self, url: str, prefix: str, key: Optional[str] = None, request_copy: bool = True) -> Dict:
+        """
+        Descarga una imagen generada por OpenAI directamente a RESULTS_FOLDER, por bloques
+        (sin mantener el PNG completo en memoria). Con request_copy=False devuelve el
+        archivo de la caché en lugar de una copia propia (para repartirlo entre peticiones).
+        """
+        path = self._generation_path(prefix, key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            async with self._http.stream("GET", url) as response:
+                response.raise_for_status()
+                async with aiofiles.open(tmp_path, "wb") as f:
+                    async for chunk in response.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                        await f.write(chunk)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        
+        return await asyncio.to_thread(self._finish_generation, tmp_path, path, prefix if request_copy else None)
+    
+    async def _single_flight(self, key: str, factory: Callable[[], Awaitable[Dict]]) -> Dict:
+        """
+        Agrupa las peticiones simultáneas con la misma clave: la primera lanza la generación y
+        las demás esperan su resultado (o su excepción) en lugar de llamar otra vez a la API.
+        La tarea se protege con shield: si la petición que la lanzó se cancela, las demás siguen.
+        """
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            logger.info("Joining in-flight DALL-E generation")
+        return await asyncio.shield(task)
+    
+    async def _generate_prompt_image(self, complete_prompt: str, key: str, request_copy: bool = True) -> Dict:
+        """
+        Genera con DALL-E 3 la imagen de un prompt (sin caché) y la descarga a disco.
+        """
+        # Call OpenAI DALL-E 3 API
+        response = await _limited(
+            self.client.images.generate,
+            model="dall-e-3",
+            prompt=complete_prompt,
+            size="1024x1024",
+            quality="standard",
+            n=1,
+        )
+        
+        # Get the generated image URL
+        image_url = response.data[0].url
+        
+        # Download the image to disk (the result keeps the local path for a Cloudinary upload)
+        return await self._download_generation(image_url, "prompt", key, request_copy)
+    
+    async def generate_from_prompt(self, prompt: str, settings: PixelArtProcessSettings) -> Optional[Dict]:
         """
         Generates pixel art from a text prompt using OpenAI DALL-E.
+        OpenAI calls are limited by the concurrency semaphore; file access runs in worker threads.
         
         Args:
             prompt: The descriptive prompt to generate the image
@@ -28,50 +421,41 @@ class OpenAIService:
         """
         try:
             # Debug logs
-            logger.debug(f"Using OpenAI API Key: {bool(app_settings.OPENAI_API_KEY)}")
-            logger.debug(f"Original prompt: {prompt}")
+            logger.debug("Using OpenAI API Key: %s", bool(app_settings.OPENAI_API_KEY))
+            logger.debug("Original prompt: %s", prompt)
             
             # Build a comprehensive prompt that incorporates all settings
             complete_prompt = self._build_comprehensive_prompt(prompt, settings)
             
-            logger.info(f"Sending prompt to OpenAI: {complete_prompt[:100]}...")
-            print(f"Complete prompt for OpenAI: {complete_prompt}")
-            
-            # Call OpenAI DALL-E 3 API
-            response = self.client.images.generate(
-                model="dall-e-3",
-                prompt=complete_prompt,
-                size="1024x1024",
-                quality="standard",
-                n=1,
-            )
-            
-            # Get the generated image URL
-            image_url = response.data[0].url
+            logger.info("Sending prompt to OpenAI: %.100s...", complete_prompt)
+            logger.debug("Complete prompt for OpenAI: %s", complete_prompt)
             
-            # Download the image
-            image_data = httpx.get(image_url).content
+            # Reutilizar la imagen si este mismo prompt ya se generó
+            key = _generation_key(complete_prompt, "standard")
+            cached = await asyncio.to_thread(self._cached_generation, key, "prompt")
+            if cached:
+                return cached
             
-            # Save the image locally
-            os.makedirs(app_settings.RESULTS_FOLDER, exist_ok=True)
-            timestamp = int(time.time())
-            image_filename = f"prompt_{timestamp}.png"
-            image_path = os.path.join(app_settings.RESULTS_FOLDER, image_filename)
+            if not app_settings.OPENAI_CACHE_GENERATIONS:
+                return await self._generate_prompt_image(complete_prompt, key)
             
-            with open(image_path, "wb") as f:
-                f.write(image_data)
-                
-            # Prepare the result data with local path for potential Cloudinary upload
-            result = {
-                "image_url": f"/images/results/{image_filename}",  # Relative path for the frontend
-                "thumbnail_url": f"/images/results/{image_filename}",  # Same for thumbnail initially
-                "width": 1024,  # Default DALL-E size
-                "height": 1024,
-                "local_path": image_path  # Add local path for Cloudinary upload
-            }
-            
-            return result
+            # Las peticiones simultáneas del mismo prompt comparten una sola llamada a la API
+            # (y el archivo de la caché); cada una se lleva después su propia copia, porque
+            # la subida a Cloudinary de una borraría el archivo de las demás
+            shared = await self._single_flight(
+                f"prompt:{key}", lambda: self._generate_prompt_image(complete_prompt, key, request_copy=False)
+            )
+            return await asyncio.to_thread(
+                self._request_copy,
+                shared["local_path"],
+                "prompt",
+                shared["width"],
+                shared["height"]
+            )
             
+        except BadRequestError as e:
+            logger.warning(f"OpenAI rejected the prompt: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Error generating image from prompt: {str(e)}")
             return None
@@ -87,74 +471,27 @@ class OpenAIService:
         Returns:
             A detailed prompt for DALL-E that incorporates all settings
         """
-        # Obtener detalles del estilo pixel art solicitado
-        style_info = self._get_style_info(settings.style)
-        pixel_scale = settings.pixelSize
-        
-        # Obtener colores de la paleta
-        palette_colors = self._get_palette_colors(settings.paletteId)
-        color_codes = " ".join(palette_colors)
-        
-        # Obtener información sobre el fondo
-        background_info = self._get_background_info(settings.backgroundType)
-        
-        # Crear una descripción compacta y específica
-        background_directive = "transparent background" if settings.backgroundType == BackgroundType.TRANSPARENT else background_info
-
-        # Prompt principal - evitando mencionar "paletas" o cualquier cosa relacionada con swatches
-        main_prompt = f"Create a {style_info} pixel art character of a {prompt}, with {pixel_scale}x{pixel_scale} pixel blocks, on a {background_directive}. Color scheme: {color_codes}. Character only, no text, no UI elements."
-        
-        # Verificación adicional para asegurarse de que el prompt no mencione paletas
-        final_prompt = main_prompt.replace("palette", "colors").replace("swatch", "colors").replace("color scheme display", "")
-        
-        return final_prompt
+        return _build_prompt(prompt, settings.style, settings.pixelSize, settings.paletteId, settings.backgroundType)
     
     def _get_style_info(self, style: PixelArtStyle) -> str:
         """
         Returns a simple description of the pixel art style.
         """
-        style_info = {
-            PixelArtStyle.RETRO_8BIT: "retro 8-bit NES-style",
-            PixelArtStyle.MODERN_16BIT: "16-bit SNES-style",
-            PixelArtStyle.MINIMALIST: "minimalist",
-            PixelArtStyle.DITHERED: "dithered",
-            PixelArtStyle.ISOMETRIC: "isometric"
-        }
-        return style_info.get(style, "classic")
-    
-    def _get_palette_colors(self, palette_id: str) -> list:
-        """
-        Returns the color codes for the specified palette.
-        """
-        palette_colors = {
-            'gameboy': ["#0f380f", "#306230", "#8bac0f", "#9bbc0f"],
-            'nes': ["#000000", "#fcfcfc", "#f8f8f8", "#bcbcbc", "#7c7c7c", "#a4000c"],
-            'cga': ["#000000", "#555555", "#aaaaaa", "#ffffff", "#0000aa", "#5555ff"],
-            'pico8': ["#000000", "#1D2B53", "#7E2553", "#008751", "#AB5236", "#5F574F"],
-            'moody': ["#5e315b", "#8c3f5d", "#ba6156", "#f2a65a"]
-        }
-        
-        return palette_colors.get(palette_id, ["#000000", "#333333", "#777777", "#ffffff"])
+        return _STYLE_INFO.get(style, "classic")
     
-    def _get_background_info(self, background_type: BackgroundType) -> str:
+    def _get_color_codes(self, palette_id: str) -> str:
         """
-        Returns a simple description of the background.
+        Returns the palette colors already joined for the prompt ("#rrggbb #rrggbb ...").
         """
-        background_info = {
-            BackgroundType.TRANSPARENT: "transparent",
-            BackgroundType.SOLID: "simple solid color",
-            BackgroundType.GRADIENT: "subtle gradient",
-            BackgroundType.PATTERN: "simple pattern"
-        }
-        return background_info.get(background_type, "simple")
+        return _PALETTE_COLOR_CODES.get(palette_id, _DEFAULT_COLOR_CODES)
     
-    async def process_image(self, image_path: str, settings: PixelArtProcessSettings, palette_colors: list = None, user_prompt: str = None) -> Optional[Dict]:
+    async def process_image(self, image: Union[str, bytes], settings: PixelArtProcessSettings, palette_colors: list = None, user_prompt: str = None) -> Optional[Dict]:
         """
         Procesa una imagen existente para convertirla en pixel art, utilizando GPT-4o para
         análisis de la imagen y generación de prompts mejorados para DALL-E 3.
         
         Args:
-            image_path: Ruta local de la imagen a procesar
+            image: Ruta local de la imagen a procesar o sus bytes ya leídos
             settings: Configuración de procesamiento para el pixel art
             palette_colors: Lista opcional de colores de la paleta a usar
             user_prompt: Prompt opcional del usuario para guiar la transformación
@@ -163,10 +500,13 @@ class OpenAIService:
             Diccionario con los datos de la imagen procesada o None si hubo un error
         """
         try:
-            # Leer la imagen para análisis
-            with open(image_path, "rb") as image_file:
-                image_bytes = image_file.read()
-                base64_image = base64.b64encode(image_bytes).decode('utf-8')
+            # Leer la imagen para análisis (si no se recibieron ya los bytes)
+            if isinstance(image, bytes):
+                image_bytes = image
+            else:
+                async with aiofiles.open(image, "rb") as image_file:
+                    image_bytes = await image_file.read()
+            vision_url = await asyncio.to_thread(_vision_image_url, image_bytes)
             
             # Obtener estilo y configuración
             style_info = self._get_style_info(settings.style)
@@ -174,15 +514,13 @@ class OpenAIService:
             
             # Obtener colores de la paleta
             if palette_colors and len(palette_colors) > 0:
-                colors = palette_colors
+                color_codes = " ".join(palette_colors)
             else:
-                colors = self._get_palette_colors(settings.paletteId)
-            
-            color_codes = " ".join(colors)
+                color_codes = self._get_color_codes(settings.paletteId)
             
             # Paso 1: Analizar la imagen original con GPT-4o
             try:
-                logger.info(f"Analyzing original image with GPT-4o: {image_path}")
+                logger.info(f"Analyzing original image with GPT-4o ({len(image_bytes)} bytes)")
                 
                 analysis_prompt = """
                 Analiza esta imagen con detalle y proporciona una descripción completa.
@@ -199,28 +537,8 @@ class OpenAIService:
                 que serían importantes preservar en esa transformación.
                 """
                 
-                response_vision = self.client.chat.completions.create(
-                    model="gpt-4o",
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text", 
-                                    "text": analysis_prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": f"data:image/png;base64,{base64_image}"}
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=800
-                )
-                
-                # Obtener el análisis de la imagen
-                image_analysis = response_vision.choices[0].message.content
+                # Obtener el análisis de la imagen (en caché si ya se analizó esta misma imagen)
+                image_analysis = await self._describe_image(vision_url, analysis_prompt, max_tokens=800)
                 logger.info(f"Image analysis complete. Description length: {len(image_analysis)}")
                 
             except Exception as vision_error:
@@ -251,11 +569,18 @@ class OpenAIService:
                     f"Respect the original composition but enhance it with classic pixel art techniques appropriate for {style_info}."
                 )
             
-            logger.info(f"Generating pixel art with DALL-E 3 using prompt: {detailed_prompt[:150]}...")
+            logger.info("Generating pixel art with DALL-E 3 using prompt: %.150s...", detailed_prompt)
+            
+            # Reutilizar la imagen si este mismo prompt ya se generó
+            key = _generation_key(detailed_prompt, "standard")
+            cached = await asyncio.to_thread(self._cached_generation, key, "processed")
+            if cached:
+                return cached
             
             # Paso 3: Generar la imagen con DALL-E 3
             try:
-                response = self.client.images.generate(
+                response = await _limited(
+                    self.client.images.generate,
                     model="dall-e-3",
                     prompt=detailed_prompt,
                     size="1024x1024",
@@ -271,8 +596,9 @@ class OpenAIService:
                 # Si falla DALL-E 3, intentar con imagen de variación como último recurso
                 try:
                     logger.warning("Falling back to image variation as last resort")
-                    response = self.client.images.create_variation(
-                        image=open(image_path, "rb"),
+                    response = await _limited(
+                        self.client.images.create_variation,
+                        image=("image.png", image_bytes),
                         n=1,
                         size="1024x1024"
                     )
@@ -280,90 +606,75 @@ class OpenAIService:
                 except Exception as variation_error:
                     logger.error(f"Image variation also failed: {str(variation_error)}")
                     return None
+                # La variación no corresponde al prompt: no se guarda en la caché
+                key = None
             
-            # Descargar imagen procesada
-            image_data = httpx.get(processed_url).content
-            
-            # Guardar localmente
-            timestamp = int(time.time())
-            processed_filename = f"processed_{timestamp}.png"
-            processed_path = os.path.join(app_settings.RESULTS_FOLDER, processed_filename)
-            
-            with open(processed_path, "wb") as f:
-                f.write(image_data)
-            
-            # Preparar resultado
-            result = {
-                "image_url": f"/images/results/{processed_filename}",
-                "thumbnail_url": f"/images/results/{processed_filename}",
-                "width": 1024,
-                "height": 1024,
-                "local_path": processed_path
-            }
-            
-            return result
+            # Descargar la imagen procesada a disco
+            return await self._download_generation(processed_url, "processed", key)
             
         except Exception as e:
             logger.error(f"Error processing image: {str(e)}")
             return None
-    async def update_image(self, image_path: str, prompt: str, settings: PixelArtProcessSettings, palette_colors: list = None) -> Optional[Dict]:
+    async def update_image(self, image_path: Optional[str], prompt: str, settings: PixelArtProcessSettings, palette_colors: list = None, image_url: Optional[str] = None) -> Optional[Dict]:
         """
         Actualiza una imagen de pixel art existente aplicando modificaciones según el prompt.
         Utiliza GPT-4 con visión para analizar la imagen y DALL-E 3 para generar la versión actualizada.
         
         Args:
-            image_path: Ruta local de la imagen existente
+            image_path: Ruta local de la imagen existente (se ignora si se indica image_url)
             prompt: Texto que describe las modificaciones a realizar
             settings: Configuración de procesamiento para el pixel art
             palette_colors: Lista opcional de colores de la paleta a usar
+            image_url: URL pública de la imagen (p. ej. en Cloudinary). GPT-4o la descarga
+                directamente con detail "low": no se lee ni se codifica en base64 aquí
                 
         Returns:
             Diccionario con los datos de la imagen procesada o None si hubo un error
         """
+        if image_url:
+            return await self._update_image(image_url, None, prompt, settings, palette_colors, detail="low")
+        
+        try:
+            # La imagen codificada se reutiliza mientras el archivo no cambie (mtime y tamaño)
+            stat = await asyncio.to_thread(os.stat, image_path)
+            vision_url = await asyncio.to_thread(
+                _vision_image_url_for_file, image_path, stat.st_mtime_ns, stat.st_size
+            )
+        except Exception as e:
+            logger.error(f"Error reading image {image_path}: {str(e)}")
+            return None
+        
+        return await self._update_image(vision_url, stat.st_size, prompt, settings, palette_colors)
+    
+    async def _update_image(self, vision_url: str, image_size: Optional[int], prompt: str, settings: PixelArtProcessSettings, palette_colors: list = None, detail: Optional[str] = None) -> Optional[Dict]:
+        """
+        Analiza la imagen (data URI ya preparado o URL pública) con GPT-4o y genera la versión actualizada con DALL-E 3.
+        """
         try:
-            # Leer la imagen para convertir a base64
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-            
             # Obtener estilo y configuración
             style_info = self._get_style_info(settings.style)
             pixel_scale = settings.pixelSize
             
             # Obtener colores de la paleta
             if palette_colors and len(palette_colors) > 0:
-                colors = palette_colors
+                color_codes = " ".join(palette_colors)
             else:
-                colors = self._get_palette_colors(settings.paletteId)
-            
-            color_codes = " ".join(colors)
+                color_codes = self._get_color_codes(settings.paletteId)
             
             # Paso 1: Usar GPT-4 con visión para analizar la imagen actual
             try:
-                logger.info(f"Analyzing image with GPT-4 Vision: {image_path}")
+                if image_size is None:
+                    logger.info(f"Analyzing image with GPT-4 Vision from URL: {vision_url}")
+                else:
+                    logger.info(f"Analyzing image with GPT-4 Vision ({image_size} bytes)")
                 
-                # Usar la versión actual de GPT-4 con capacidades de visión
-                response_vision = self.client.chat.completions.create(
-                    model="gpt-4o", # La última versión con capacidades de visión
-                    messages=[
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text", 
-                                    "text": "Describe esta imagen de pixel art en detalle. Menciona el tema principal, estilo, colores, elementos importantes y cualquier característica destacable. Sé muy específico."
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {"url": f"data:image/png;base64,{base64_image}"}
-                                }
-                            ]
-                        }
-                    ],
-                    max_tokens=500
+                # Obtener la descripción de la imagen actual (en caché si ya se analizó esta misma imagen)
+                image_description = await self._describe_image(
+                    vision_url,
+                    "Describe esta imagen de pixel art en detalle. Menciona el tema principal, estilo, colores, elementos importantes y cualquier característica destacable. Sé muy específico.",
+                    max_tokens=500,
+                    detail=detail
                 )
-                
-                # Obtener la descripción de la imagen actual
-                image_description = response_vision.choices[0].message.content
                 logger.info(f"Image analysis complete. Description length: {len(image_description)}")
                 
             except Exception as vision_error:
@@ -382,10 +693,17 @@ class OpenAIService:
                 f"Do not alter any details other than the requested modification."
             )
             
-            logger.info(f"Generating modified image with DALL-E 3 using prompt: {detailed_prompt[:100]}...")
+            logger.info("Generating modified image with DALL-E 3 using prompt: %.100s...", detailed_prompt)
+            
+            # Reutilizar la imagen si este mismo prompt ya se generó
+            key = _generation_key(detailed_prompt, "hd")
+            cached = await asyncio.to_thread(self._cached_generation, key, "updated")
+            if cached:
+                return cached
             
             # Paso 3: Generar la imagen actualizada con DALL-E 3
-            response = self.client.images.generate(
+            response = await _limited(
+                self.client.images.generate,
                 model="dall-e-3",
                 prompt=detailed_prompt,
                 size="1024x1024",
@@ -396,28 +714,12 @@ class OpenAIService:
             processed_url = response.data[0].url
             logger.info("Successfully generated updated image with DALL-E 3")
             
-            # Descargar imagen procesada
-            image_data = httpx.get(processed_url).content
-            
-            # Guardar localmente
-            timestamp = int(time.time())
-            processed_filename = f"updated_{timestamp}.png"
-            processed_path = os.path.join(app_settings.RESULTS_FOLDER, processed_filename)
-            
-            with open(processed_path, "wb") as f:
-                f.write(image_data)
-            
-            # Preparar resultado
-            result = {
-                "image_url": f"/images/results/{processed_filename}",
-                "thumbnail_url": f"/images/results/{processed_filename}",
-                "width": 1024,
-                "height": 1024,
-                "local_path": processed_path
-            }
-            
-            return result
+            # Descargar la imagen procesada a disco
+            return await self._download_generation(processed_url, "updated", key)
                 
+        except BadRequestError as e:
+            logger.warning(f"OpenAI rejected the update prompt: {str(e)}")
+            return None
         except Exception as e:
             logger.error(f"Error updating image: {str(e)}")
             return None
\ No newline at end of file
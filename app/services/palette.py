@@ -1,5 +1,7 @@
 #app/service/pallete.py
 from typing import List, Optional, Dict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.database.models import DBColorPalette
 import logging
@@ -21,6 +23,22 @@ class PaletteService:
         """
         return db.query(DBColorPalette).filter(DBColorPalette.id == palette_id).first()
     
+    @staticmethod
+    async def get_palettes_async(db: AsyncSession) -> List[DBColorPalette]:
+        """
+        Obtiene todas las paletas de colores usando una sesión asíncrona.
+        """
+        result = await db.execute(select(DBColorPalette))
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def get_palette_by_id_async(db: AsyncSession, palette_id: str) -> Optional[DBColorPalette]:
+        """
+        Obtiene una paleta específica por su ID usando una sesión asíncrona.
+        """
+        result = await db.execute(select(DBColorPalette).where(DBColorPalette.id == palette_id))
+        return result.scalars().first()
+    
     @staticmethod
     def create_palette(db: Session, palette_id: str, name: str, colors: List[str]) -> DBColorPalette:
         """
@@ -66,18 +84,18 @@ class PaletteService:
         Returns:
             La paleta actualizada o None si no se encontró
         """
-        db_palette = PaletteService.get_palette_by_id(db, palette_id)
-        if not db_palette:
+        # Solo columnas reales del modelo
+        values = {key: value for key, value in updates.items() if key in DBColorPalette.__table__.columns}
+        if not values:
+            return PaletteService.get_palette_by_id(db, palette_id)
+        
+        # Actualizar todos los campos en una única sentencia UPDATE
+        updated_rows = db.query(DBColorPalette).filter(DBColorPalette.id == palette_id).update(values)
+        if not updated_rows:
             return None
-            
-        # Actualizar campos
-        for key, value in updates.items():
-            if hasattr(db_palette, key):
-                setattr(db_palette, key, value)
         
         db.commit()
-        db.refresh(db_palette)
-        return db_palette
+        return PaletteService.get_palette_by_id(db, palette_id)
     
     @staticmethod
     def delete_palette(db: Session, palette_id: str) -> bool:
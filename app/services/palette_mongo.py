@@ -1,29 +1,48 @@
 import logging
 from datetime import datetime
 from typing import List, Optional, Dict
-from app.database.mongodb import sync_palettes_collection, sync_pixel_arts_collection
+from cachetools import TTLCache
+from app.database.mongodb import palettes_collection, pixel_arts_collection
 
 logger = logging.getLogger(__name__)
 
+# Caché en memoria de paletas por ID (cambian muy poco y se consultan en cada imagen).
+# Solo se accede desde el event loop, así que no necesita lock.
+PALETTE_CACHE_TTL = 300
+_palette_cache = TTLCache(maxsize=256, ttl=PALETTE_CACHE_TTL)
+
+def _invalidate_palette(palette_id: str):
+    """
+    Elimina una paleta de la caché tras modificarla.
+    """
+    _palette_cache.pop(palette_id, None)
+
 class PaletteMongoService:
     """Servicio para gestionar paletas de colores en MongoDB"""
     
     @staticmethod
-    def get_palettes() -> List[Dict]:
+    async def get_palettes() -> List[Dict]:
         """
         Obtiene todas las paletas de colores desde MongoDB.
         """
-        return list(sync_palettes_collection.find())
+        return await palettes_collection.find().to_list(length=None)
     
     @staticmethod
-    def get_palette_by_id(palette_id: str) -> Optional[Dict]:
+    async def get_palette_by_id(palette_id: str) -> Optional[Dict]:
         """
-        Obtiene una paleta específica por su ID desde MongoDB.
+        Obtiene una paleta específica por su ID desde MongoDB (con caché TTL).
         """
-        return sync_palettes_collection.find_one({"id": palette_id})
+        palette = _palette_cache.get(palette_id)
+        if palette is not None:
+            return palette
+        
+        palette = await palettes_collection.find_one({"id": palette_id})
+        if palette is not None:
+            _palette_cache[palette_id] = palette
+        return palette
     
     @staticmethod
-    def create_palette(palette_id: str, name: str, colors: List[str], description: str = None) -> Dict:
+    async def create_palette(palette_id: str, name: str, colors: List[str], description: str = None) -> Dict:
         """
         Crea una nueva paleta de colores en MongoDB.
         
@@ -37,7 +56,7 @@ class PaletteMongoService:
             La paleta creada como diccionario
         """
         # Verificar si ya existe una paleta con ese ID
-        existing = PaletteMongoService.get_palette_by_id(palette_id)
+        existing = await PaletteMongoService.get_palette_by_id(palette_id)
         if existing:
             raise ValueError(f"Palette with ID {palette_id} already exists")
         
@@ -53,12 +72,13 @@ class PaletteMongoService:
         }
         
         # Insertar en MongoDB
-        sync_palettes_collection.insert_one(palette_doc)
+        await palettes_collection.insert_one(palette_doc)
+        _invalidate_palette(palette_id)
         
         return palette_doc
     
     @staticmethod
-    def update_palette(palette_id: str, updates: Dict) -> Optional[Dict]:
+    async def update_palette(palette_id: str, updates: Dict) -> Optional[Dict]:
         """
         Actualiza una paleta existente en MongoDB.
         
@@ -70,7 +90,7 @@ class PaletteMongoService:
             La paleta actualizada o None si no se encontró
         """
         # Verificar si existe
-        existing = PaletteMongoService.get_palette_by_id(palette_id)
+        existing = await PaletteMongoService.get_palette_by_id(palette_id)
         if not existing:
             return None
         
@@ -78,16 +98,17 @@ class PaletteMongoService:
         updates["updatedAt"] = datetime.now()
         
         # Actualizar en MongoDB
-        sync_palettes_collection.update_one(
+        await palettes_collection.update_one(
             {"id": palette_id},
             {"$set": updates}
         )
+        _invalidate_palette(palette_id)
         
         # Obtener el documento actualizado
-        return PaletteMongoService.get_palette_by_id(palette_id)
+        return await PaletteMongoService.get_palette_by_id(palette_id)
     
     @staticmethod
-    def delete_palette(palette_id: str) -> bool:
+    async def delete_palette(palette_id: str) -> bool:
         """
         Elimina una paleta de MongoDB.
         
@@ -98,21 +119,22 @@ class PaletteMongoService:
             True si se eliminó correctamente, False si no se encontró
         """
         # Verificar si existe
-        existing = PaletteMongoService.get_palette_by_id(palette_id)
+        existing = await PaletteMongoService.get_palette_by_id(palette_id)
         if not existing:
             return False
         
         # Verificar si hay pixel arts que usan esta paleta
-        pixel_arts_count = sync_pixel_arts_collection.count_documents({"paletteId": palette_id})
+        pixel_arts_count = await pixel_arts_collection.count_documents({"paletteId": palette_id})
         if pixel_arts_count > 0:
             raise ValueError(f"Cannot delete palette {palette_id} because it is used by {pixel_arts_count} existing pixel arts")
         
         # Eliminar de MongoDB
-        result = sync_palettes_collection.delete_one({"id": palette_id})
+        result = await palettes_collection.delete_one({"id": palette_id})
+        _invalidate_palette(palette_id)
         return result.deleted_count > 0
     
     @staticmethod
-    def initialize_default_palettes():
+    async def initialize_default_palettes():
         """
         Inicializa las paletas predeterminadas en MongoDB.
         """
@@ -153,10 +175,10 @@ class PaletteMongoService:
         for palette_data in default_palettes:
             try:
                 # Verificar si ya existe
-                existing = PaletteMongoService.get_palette_by_id(palette_data["id"])
+                existing = await PaletteMongoService.get_palette_by_id(palette_data["id"])
                 if not existing:
                     # Crear la paleta
-                    PaletteMongoService.create_palette(
+                    await PaletteMongoService.create_palette(
                         palette_data["id"],
                         palette_data["name"],
                         palette_data["colors"],
@@ -3,7 +3,9 @@ import os
 import uuid
 import logging
 from typing import List, Optional, Dict
-from sqlalchemy.orm import Session
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from app.database.models import DBPixelArt, DBColorPalette
 from app.models.pixel_art import PixelArt, PixelArtCreate, ColorPalette
 from app.config import settings
@@ -27,6 +29,40 @@ class PixelArtService:
         """
         return db.query(DBPixelArt).filter(DBPixelArt.id == pixel_art_id).first()
     
+    @staticmethod
+    async def get_pixel_arts_async(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[DBPixelArt]:
+        """
+        Obtiene una lista de pixel arts usando una sesión asíncrona.
+        La paleta se carga de antemano porque la carga perezosa no funciona en modo asíncrono.
+        """
+        result = await db.execute(
+            select(DBPixelArt)
+            .options(selectinload(DBPixelArt.palette))
+            .offset(skip)
+            .limit(limit)
+        )
+        return list(result.scalars().all())
+    
+    @staticmethod
+    async def count_pixel_arts_async(db: AsyncSession) -> int:
+        """
+        Cuenta el total de pixel arts con un SELECT COUNT(*) (sin cargar las filas).
+        """
+        result = await db.execute(select(func.count()).select_from(DBPixelArt))
+        return result.scalar_one()
+    
+    @staticmethod
+    async def get_pixel_art_by_id_async(db: AsyncSession, pixel_art_id: str) -> Optional[DBPixelArt]:
+        """
+        Obtiene un pixel art específico por su ID usando una sesión asíncrona.
+        """
+        result = await db.execute(
+            select(DBPixelArt)
+            .options(selectinload(DBPixelArt.palette))
+            .where(DBPixelArt.id == pixel_art_id)
+        )
+        return result.scalars().first()
+    
     @staticmethod
     def create_pixel_art(
         db: Session, 
@@ -136,18 +172,18 @@ class PixelArtService:
         Returns:
             El objeto DBPixelArt actualizado o None si no se encuentra
         """
-        db_pixel_art = PixelArtService.get_pixel_art_by_id(db, pixel_art_id)
-        if not db_pixel_art:
+        # Solo columnas reales del modelo
+        values = {key: value for key, value in updates.items() if key in DBPixelArt.__table__.columns}
+        if not values:
+            return PixelArtService.get_pixel_art_by_id(db, pixel_art_id)
+        
+        # Actualizar todos los campos en una única sentencia UPDATE
+        updated_rows = db.query(DBPixelArt).filter(DBPixelArt.id == pixel_art_id).update(values)
+        if not updated_rows:
             return None
-            
-        # Actualizar campos
-        for key, value in updates.items():
-            if hasattr(db_pixel_art, key):
-                setattr(db_pixel_art, key, value)
         
         db.commit()
-        db.refresh(db_pixel_art)
-        return db_pixel_art
+        return PixelArtService.get_pixel_art_by_id(db, pixel_art_id)
     
     @staticmethod
     def delete_pixel_art(
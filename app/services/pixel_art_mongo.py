@@ -1,28 +1,59 @@
 #app/services/pixel_art_mongo.py
 import os
+import copy
 import uuid
+import asyncio
 import logging
 from typing import List, Optional, Dict, Union
 from datetime import datetime
-from app.database.mongodb import sync_pixel_arts_collection, sync_palettes_collection
+from cachetools import TTLCache
+from app.database.mongodb import pixel_arts_collection, palettes_collection, processed_cache_collection
 from app.models.pixel_art import PixelArt, PixelArtCreate, ColorPalette
 from app.config import settings
 from app.services.cloudinary_service import CloudinaryService
 
 logger = logging.getLogger(__name__)
 
+# Caché corta de pixel arts por ID. Un lock por ID hace que, si llegan varias peticiones
+# a la vez para el mismo documento, solo una consulte MongoDB y el resto use su resultado.
+# Cada worker tiene su propia caché y las escrituras solo invalidan la del que las atiende:
+# el TTL es de pocos segundos para que los demás no sirvan un documento antiguo por más tiempo.
+PIXEL_ART_CACHE_TTL = 5
+_pixel_art_cache = TTLCache(maxsize=4096, ttl=PIXEL_ART_CACHE_TTL)
+_pixel_art_locks: Dict[str, asyncio.Lock] = {}
+# Corrutinas que usan (o esperan) cada lock: solo se descarta cuando no queda ninguna
+_pixel_art_lock_users: Dict[str, int] = {}
+# Se incrementa en cada invalidación: una consulta que empezó antes no guarda su resultado
+_pixel_art_cache_epoch = 0
+
+# Total de pixel arts para la paginación, en caché unos segundos (count_documents recorre el índice)
+PIXEL_ART_COUNT_TTL = 30
+_pixel_art_count_cache = TTLCache(maxsize=1, ttl=PIXEL_ART_COUNT_TTL)
+
+# Número máximo de versiones anteriores que se guardan en versionHistory
+MAX_VERSION_HISTORY = 5
+
+def _invalidate_pixel_art(pixel_art_id: str):
+    """
+    Elimina un pixel art de la caché tras modificarlo.
+    """
+    global _pixel_art_cache_epoch
+    _pixel_art_cache_epoch += 1
+    _pixel_art_cache.pop(pixel_art_id, None)
+
 class PixelArtMongoService:
     """Servicio para gestionar pixel arts en MongoDB"""
     
     @staticmethod
-    def get_pixel_arts(skip: int = 0, limit: int = 100) -> List[Dict]:
+    async def get_pixel_arts(skip: int = 0, limit: int = 100) -> List[Dict]:
         """
-        Obtiene una lista de pixel arts desde MongoDB, incluyendo la información de la paleta.
+        Obtiene una lista de pixel arts desde MongoDB (los más recientes primero),
+        incluyendo la información de la paleta.
         """
-        pixel_arts = list(sync_pixel_arts_collection.find().skip(skip).limit(limit))
+        pixel_arts = await pixel_arts_collection.find().sort("_id", -1).skip(skip).limit(limit).to_list(length=None)
         
         # Obtener todas las paletas disponibles para hacer una búsqueda eficiente
-        all_palettes = {p["id"]: p for p in sync_palettes_collection.find()}
+        all_palettes = {p["id"]: p async for p in palettes_collection.find()}
        
         
         # Agregar el campo palette a cada pixel art
@@ -38,20 +69,60 @@ class PixelArtMongoService:
                     "colors": ["#0f380f", "#306230", "#8bac0f", "#9bbc0f"]  # Colores Gameboy por defecto
                 }
                 art["palette"] = default_palette
-        print(pixel_arts)
         return pixel_arts
     
     @staticmethod
-    def get_pixel_art_by_id(pixel_art_id: str) -> Optional[Dict]:
+    async def count_pixel_arts() -> int:
+        """
+        Devuelve el número total de pixel arts (con caché TTL).
+        """
+        total = _pixel_art_count_cache.get("total")
+        if total is None:
+            total = await pixel_arts_collection.count_documents({})
+            _pixel_art_count_cache["total"] = total
+        return total
+    
+    @staticmethod
+    async def get_pixel_art_by_id(pixel_art_id: str) -> Optional[Dict]:
+        """
+        Obtiene un pixel art específico por su ID, incluyendo información de su paleta
+        (con caché TTL y una sola consulta en vuelo por ID). Devuelve una copia: quien
+        la modifique no altera el documento en caché que leen las demás peticiones.
+        """
+        pixel_art = _pixel_art_cache.get(pixel_art_id)
+        if pixel_art is not None:
+            return copy.deepcopy(pixel_art)
+        
+        lock = _pixel_art_locks.setdefault(pixel_art_id, asyncio.Lock())
+        _pixel_art_lock_users[pixel_art_id] = _pixel_art_lock_users.get(pixel_art_id, 0) + 1
+        try:
+            async with lock:
+                pixel_art = _pixel_art_cache.get(pixel_art_id)
+                if pixel_art is None:
+                    epoch = _pixel_art_cache_epoch
+                    pixel_art = await PixelArtMongoService._fetch_pixel_art(pixel_art_id)
+                    # Si hubo una escritura durante la consulta, el resultado puede ser anterior a ella
+                    if pixel_art is not None and epoch == _pixel_art_cache_epoch:
+                        _pixel_art_cache[pixel_art_id] = pixel_art
+        finally:
+            _pixel_art_lock_users[pixel_art_id] -= 1
+            if not _pixel_art_lock_users[pixel_art_id]:
+                del _pixel_art_lock_users[pixel_art_id]
+                _pixel_art_locks.pop(pixel_art_id, None)
+        
+        return copy.deepcopy(pixel_art)
+    
+    @staticmethod
+    async def _fetch_pixel_art(pixel_art_id: str) -> Optional[Dict]:
         """
-        Obtiene un pixel art específico por su ID, incluyendo información de su paleta.
+        Lee un pixel art de MongoDB y le añade la información de su paleta.
         """
-        pixel_art = sync_pixel_arts_collection.find_one({"id": pixel_art_id})
+        pixel_art = await pixel_arts_collection.find_one({"id": pixel_art_id})
         
         if pixel_art:
             # Buscar la información de la paleta asociada
             if "paletteId" in pixel_art:
-                palette = sync_palettes_collection.find_one({"id": pixel_art["paletteId"]})
+                palette = await palettes_collection.find_one({"id": pixel_art["paletteId"]})
                 if palette:
                     # Si encontramos la paleta, la agregamos al objeto
                     pixel_art["palette"] = palette
@@ -77,7 +148,7 @@ class PixelArtMongoService:
 # Modificar el método create_pixel_art en pixel_art_mongo.py para inicializar el historial de versiones
 
     @staticmethod
-    def create_pixel_art(
+    async def create_pixel_art(
         pixel_art: PixelArtCreate, 
         image_data: Dict, 
         cloudinary_service: Optional[CloudinaryService] = None
@@ -94,7 +165,7 @@ class PixelArtMongoService:
             El nuevo objeto pixel art creado como diccionario
         """
         # Verificar si la paleta existe
-        db_palette = sync_palettes_collection.find_one({"id": pixel_art.paletteId})
+        db_palette = await palettes_collection.find_one({"id": pixel_art.paletteId})
         if not db_palette:
             raise ValueError(f"Palette with ID {pixel_art.paletteId} not found")
         
@@ -106,13 +177,14 @@ class PixelArtMongoService:
         
         # Si hay una ruta de archivo local y Cloudinary está disponible, subir a Cloudinary
         local_image_path = image_data.get("local_path", "")
-        cloudinary_public_id = ""
+        # (las imágenes reutilizadas de la caché de subidas ya traen su ID de Cloudinary)
+        cloudinary_public_id = image_data.get("cloudinary_public_id", "")
         
         if local_image_path and os.path.exists(local_image_path) and settings.USE_CLOUDINARY and cloudinary_service:
             try:
                 # Subir la imagen a Cloudinary
                 is_result = True  # Asumimos que es una imagen resultado
-                cloudinary_image_url, cloudinary_thumbnail_url, cloud_width, cloud_height = cloudinary_service.process_image_upload(
+                cloudinary_image_url, cloudinary_thumbnail_url, cloud_width, cloud_height = await cloudinary_service.process_image_upload_async(
                     local_image_path, is_result
                 )
                 
@@ -143,9 +215,6 @@ class PixelArtMongoService:
         now = datetime.now()
         pixel_art_id = str(uuid.uuid4())
         
-        # Inicializar el historial de versiones con la versión inicial
-        version_history = []
-        
         pixel_art_doc = {
             "id": pixel_art_id,
             "name": pixel_art.name,
@@ -163,15 +232,20 @@ class PixelArtMongoService:
             "description": None,
             "createdAt": now,
             "updatedAt": now,
-            "versionHistory": version_history  # Iniciamos con un arreglo vacío, la primera versión es la actual
+            "versionHistory": pixel_art.versionHistory  # Normalmente vacío: la primera versión es la actual
         }
         
+        # Guardar el prompt en la misma inserción (sin una actualización posterior)
+        if pixel_art.prompt:
+            pixel_art_doc["prompt"] = pixel_art.prompt
+        
         # Añadir el ID de Cloudinary si está disponible
         if cloudinary_public_id:
             pixel_art_doc["cloudinaryPublicId"] = cloudinary_public_id
         
         # Insertar en MongoDB
-        sync_pixel_arts_collection.insert_one(pixel_art_doc)
+        await pixel_arts_collection.insert_one(pixel_art_doc)
+        _pixel_art_count_cache.clear()
         
         # Añadir la información de la paleta al resultado (para mantener compatibilidad con el modelo Pydantic)
         palette = {
@@ -185,7 +259,7 @@ class PixelArtMongoService:
         return pixel_art_doc
     
     @staticmethod
-    def update_pixel_art(pixel_art_id: str, updates: Dict) -> Optional[Dict]:
+    async def update_pixel_art(pixel_art_id: str, updates: Dict) -> Optional[Dict]:
         """
         Actualiza un pixel art existente.
         
@@ -197,7 +271,7 @@ class PixelArtMongoService:
             El objeto pixel art actualizado o None si no se encuentra
         """
         # Verificar si existe
-        existing = PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
+        existing = await PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
         if not existing:
             return None
         
@@ -205,17 +279,18 @@ class PixelArtMongoService:
         updates["updatedAt"] = datetime.now()
         
         # Actualizar en MongoDB
-        sync_pixel_arts_collection.update_one(
+        await pixel_arts_collection.update_one(
             {"id": pixel_art_id},
             {"$set": updates}
         )
+        _invalidate_pixel_art(pixel_art_id)
         
         # Obtener el documento actualizado
-        updated = PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
+        updated = await PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
         
         # Añadir la información de la paleta
         if updated:
-            palette = sync_palettes_collection.find_one({"id": updated["paletteId"]})
+            palette = await palettes_collection.find_one({"id": updated["paletteId"]})
             if palette:
                 updated["palette"] = {
                     "id": palette["id"],
@@ -226,7 +301,7 @@ class PixelArtMongoService:
         return updated
     
     @staticmethod
-    def delete_pixel_art(
+    async def delete_pixel_art(
         pixel_art_id: str, 
         cloudinary_service: Optional[CloudinaryService] = None
     ) -> bool:
@@ -241,26 +316,59 @@ class PixelArtMongoService:
             True si se eliminó correctamente, False si no se encontró
         """
         # Verificar si existe
-        existing = PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
+        existing = await PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
         if not existing:
             return False
         
+        # Las subidas repetidas reutilizan la misma imagen: solo se borra si nadie más la usa
+        shared = await pixel_arts_collection.count_documents(
+            {"imageUrl": existing["imageUrl"], "id": {"$ne": pixel_art_id}}, limit=1
+        )
+        if shared:
+            logger.info(f"Image of pixel art {pixel_art_id} is shared; keeping the image files")
+        else:
+            await PixelArtMongoService._remove_image(existing, cloudinary_service)
+        
+        # Eliminar de MongoDB
+        result = await pixel_arts_collection.delete_one({"id": pixel_art_id})
+        _invalidate_pixel_art(pixel_art_id)
+        _pixel_art_count_cache.clear()
+        return result.deleted_count > 0
+    
+    @staticmethod
+    async def _remove_image(
+        pixel_art: Dict,
+        cloudinary_service: Optional[CloudinaryService] = None
+    ):
+        """
+        Elimina la imagen de un pixel art (Cloudinary, archivos locales y caché de subidas).
+        """
+        # La imagen deja de existir: sacarla de la caché de subidas
+        await processed_cache_collection.delete_many({"imageUrl": pixel_art["imageUrl"]})
+        
         # Si hay un ID de Cloudinary y el servicio está disponible, eliminar de Cloudinary
-        if "cloudinaryPublicId" in existing and existing["cloudinaryPublicId"] and settings.USE_CLOUDINARY and cloudinary_service:
+        if "cloudinaryPublicId" in pixel_art and pixel_art["cloudinaryPublicId"] and settings.USE_CLOUDINARY and cloudinary_service:
             try:
-                cloudinary_service.delete_image(existing["cloudinaryPublicId"])
-                logger.info(f"Deleted image from Cloudinary: {existing['cloudinaryPublicId']}")
+                await cloudinary_service.delete_image_async(pixel_art["cloudinaryPublicId"])
+                logger.info(f"Deleted image from Cloudinary: {pixel_art['cloudinaryPublicId']}")
             except Exception as e:
                 logger.error(f"Error deleting image from Cloudinary: {str(e)}")
         
-        # Intentar eliminar los archivos físicos locales (si existen)
+        # Eliminar los archivos físicos locales en un hilo (no bloquear el event loop)
+        await asyncio.to_thread(PixelArtMongoService._remove_local_files, pixel_art)
+    
+    @staticmethod
+    def _remove_local_files(pixel_art: Dict):
+        """
+        Elimina los archivos locales de imagen y miniatura de un pixel art (si existen).
+        """
         try:
             # Extraer nombre del archivo de las URLs
-            image_file = os.path.basename(existing["imageUrl"])
-            thumb_file = os.path.basename(existing["thumbnailUrl"])
+            image_file = os.path.basename(pixel_art["imageUrl"])
+            thumb_file = os.path.basename(pixel_art["thumbnailUrl"])
             
             # Verificar si son rutas locales
-            if not existing["imageUrl"].startswith('http'):
+            if not pixel_art["imageUrl"].startswith('http'):
                 # Construir rutas completas
                 image_path = os.path.join(settings.RESULTS_FOLDER, image_file)
                 
@@ -269,21 +377,62 @@ class PixelArtMongoService:
                     os.remove(image_path)
                     logger.info(f"Deleted local file: {image_path}")
             
-            if not existing["thumbnailUrl"].startswith('http') and thumb_file != image_file:
+            if not pixel_art["thumbnailUrl"].startswith('http') and thumb_file != image_file:
                 thumb_path = os.path.join(settings.RESULTS_FOLDER, thumb_file)
                 if os.path.exists(thumb_path):
                     os.remove(thumb_path)
                     logger.info(f"Deleted local file: {thumb_path}")
                 
         except Exception as e:
-            logger.warning(f"Error removing image files for pixel art {pixel_art_id}: {str(e)}")
+            logger.warning(f"Error removing image files for pixel art {pixel_art['id']}: {str(e)}")
+    
+    @staticmethod
+    async def get_processed_image(cache_key: str) -> Optional[Dict]:
+        """
+        Busca el resultado de una subida idéntica ya procesada (misma imagen, ajustes y prompt).
         
-        # Eliminar de MongoDB
-        result = sync_pixel_arts_collection.delete_one({"id": pixel_art_id})
-        return result.deleted_count > 0
+        Returns:
+            Datos de imagen listos para create_pixel_art o None si no hay entrada válida
+        """
+        cached = await processed_cache_collection.find_one({"_id": cache_key})
+        if not cached:
+            return None
+        
+        # Si la imagen local ya no existe, la entrada no sirve
+        image_url = cached["imageUrl"]
+        if not image_url.startswith("http"):
+            if not os.path.exists(os.path.join(settings.RESULTS_FOLDER, os.path.basename(image_url))):
+                await processed_cache_collection.delete_one({"_id": cache_key})
+                return None
+        
+        return {
+            "image_url": image_url,
+            "thumbnail_url": cached["thumbnailUrl"],
+            "width": cached["width"],
+            "height": cached["height"],
+            "cloudinary_public_id": cached.get("cloudinaryPublicId", "")
+        }
     
     @staticmethod
-    def search_pixel_arts(
+    async def save_processed_image(cache_key: str, pixel_art: Dict):
+        """
+        Guarda la imagen resultante de un pixel art recién creado en la caché de subidas.
+        """
+        await processed_cache_collection.replace_one(
+            {"_id": cache_key},
+            {
+                "imageUrl": pixel_art["imageUrl"],
+                "thumbnailUrl": pixel_art["thumbnailUrl"],
+                "width": pixel_art["width"],
+                "height": pixel_art["height"],
+                "cloudinaryPublicId": pixel_art.get("cloudinaryPublicId", ""),
+                "createdAt": datetime.now()
+            },
+            upsert=True
+        )
+    
+    @staticmethod
+    async def search_pixel_arts(
         tags: Optional[List[str]] = None,
         style: Optional[str] = None,
         palette_id: Optional[str] = None,
@@ -298,7 +447,7 @@ class PixelArtMongoService:
             tags: Lista de etiquetas para filtrar
             style: Estilo de pixel art
             palette_id: ID de la paleta
-            search_term: Término de búsqueda para el nombre
+            search_term: Término de búsqueda (palabras del nombre o de las etiquetas)
             skip: Número de documentos a saltar
             limit: Límite de resultados
             
@@ -318,18 +467,23 @@ class PixelArtMongoService:
             filter_query["paletteId"] = palette_id
         
         if search_term:
-            filter_query["name"] = {"$regex": search_term, "$options": "i"}
+            # Búsqueda sobre el índice de texto (nombre y etiquetas) en lugar de un $regex sin índice
+            filter_query["$text"] = {"$search": search_term}
         
-        # Ejecutar la consulta
-        cursor = sync_pixel_arts_collection.find(filter_query).skip(skip).limit(limit)
-        items = list(cursor)
+        # Ejecutar la consulta (por relevancia si hay término de búsqueda, si no los más recientes)
+        if search_term:
+            score = {"score": {"$meta": "textScore"}}
+            cursor = pixel_arts_collection.find(filter_query, score).sort([("score", score["score"])])
+        else:
+            cursor = pixel_arts_collection.find(filter_query).sort("createdAt", -1)
+        items = await cursor.skip(skip).limit(limit).to_list(length=None)
         
         # Obtener el total
-        total = sync_pixel_arts_collection.count_documents(filter_query)
+        total = await pixel_arts_collection.count_documents(filter_query)
         
         # Añadir información de paletas a los resultados
         for item in items:
-            palette = sync_palettes_collection.find_one({"id": item["paletteId"]})
+            palette = await palettes_collection.find_one({"id": item["paletteId"]})
             if palette:
                 item["palette"] = {
                     "id": palette["id"],
@@ -342,11 +496,12 @@ class PixelArtMongoService:
             "total": total
         }
     @staticmethod
-    def update_pixel_art_with_image(
+    async def update_pixel_art_with_image(
         pixel_art_id: str, 
         updates: Dict, 
         image_data: Dict,
-        cloudinary_service: Optional[CloudinaryService] = None
+        cloudinary_service: Optional[CloudinaryService] = None,
+        version_entry: Optional[Dict] = None
     ) -> Optional[Dict]:
         """
         Actualiza un pixel art existente con una nueva imagen,
@@ -357,6 +512,8 @@ class PixelArtMongoService:
             updates: Diccionario con los campos a actualizar
             image_data: Información de la nueva imagen procesada (URLs, dimensiones)
             cloudinary_service: Servicio opcional de Cloudinary
+            version_entry: Versión anterior a añadir al historial (se conservan las
+                MAX_VERSION_HISTORY más recientes)
                 
         Returns:
             El objeto pixel art actualizado o None si no se encuentra
@@ -364,7 +521,7 @@ class PixelArtMongoService:
         logger.info(f"Starting update_pixel_art_with_image for id={pixel_art_id}")
         
         # Verificar si existe
-        existing = PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
+        existing = await PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
         if not existing:
             logger.error(f"Pixel art with id={pixel_art_id} not found")
             return None
@@ -383,7 +540,7 @@ class PixelArtMongoService:
             try:
                 # Subir la imagen a Cloudinary
                 is_result = True  # Asumimos que es una imagen resultado
-                cloudinary_image_url, cloudinary_thumbnail_url, cloud_width, cloud_height = cloudinary_service.process_image_upload(
+                cloudinary_image_url, cloudinary_thumbnail_url, cloud_width, cloud_height = await cloudinary_service.process_image_upload_async(
                     local_image_path, is_result
                 )
                 
@@ -429,19 +586,32 @@ class PixelArtMongoService:
             logger.warning("versionHistory in updates is not a list. Fixing it.")
             updates["versionHistory"] = []
         
+        update_doc = {"$set": updates}
+        if version_entry is not None:
+            if isinstance(existing.get("versionHistory"), list):
+                # Añadir la versión y recortar el historial en el propio servidor
+                updates.pop("versionHistory", None)
+                update_doc["$push"] = {
+                    "versionHistory": {"$each": [version_entry], "$slice": -MAX_VERSION_HISTORY}
+                }
+            else:
+                # Documentos antiguos sin historial (o con null): $push fallaría
+                updates["versionHistory"] = [version_entry]
+        
         # Actualizar en MongoDB
         try:
-            result = sync_pixel_arts_collection.update_one(
+            result = await pixel_arts_collection.update_one(
                 {"id": pixel_art_id},
-                {"$set": updates}
+                update_doc
             )
             logger.info(f"MongoDB update result: matched={result.matched_count}, modified={result.modified_count}")
+            _invalidate_pixel_art(pixel_art_id)
         except Exception as db_error:
             logger.error(f"Error updating MongoDB: {str(db_error)}")
             return None
         
         # Obtener el documento actualizado
-        updated = PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
+        updated = await PixelArtMongoService.get_pixel_art_by_id(pixel_art_id)
         if not updated:
             logger.error("Failed to retrieve updated pixel art after update")
             return None
@@ -449,7 +619,7 @@ class PixelArtMongoService:
         # Añadir la información de la paleta
         if updated:
             try:
-                palette = sync_palettes_collection.find_one({"id": updated["paletteId"]})
+                palette = await palettes_collection.find_one({"id": updated["paletteId"]})
                 if palette:
                     updated["palette"] = {
                         "id": palette["id"],
@@ -1,7 +1,7 @@
 import logging
 from typing import Dict, Optional
 from datetime import datetime
-from app.database.mongodb import sync_user_settings_collection
+from app.database.mongodb import user_settings_collection
 
 logger = logging.getLogger(__name__)
 
@@ -9,7 +9,7 @@ class UserSettingsMongoService:
     """Servicio para gestionar las configuraciones de usuario en MongoDB"""
     
     @staticmethod
-    def get_user_settings(user_id: str = "default") -> Dict:
+    async def get_user_settings(user_id: str = "default") -> Dict:
         """
         Obtiene las configuraciones de un usuario específico.
         Si no existen, crea unas configuraciones por defecto.
@@ -21,7 +21,7 @@ class UserSettingsMongoService:
             Configuraciones del usuario como diccionario
         """
         # Buscar configuraciones existentes
-        settings = sync_user_settings_collection.find_one({"userId": user_id})
+        settings = await user_settings_collection.find_one({"userId": user_id})
         
         # Si no existen, crear configuraciones por defecto
         if not settings:
@@ -41,7 +41,7 @@ class UserSettingsMongoService:
             }
             
             # Insertar en MongoDB
-            sync_user_settings_collection.insert_one(default_settings)
+            await user_settings_collection.insert_one(default_settings)
             
             # Devolver las configuraciones creadas
             return default_settings
@@ -49,7 +49,7 @@ class UserSettingsMongoService:
         return settings
     
     @staticmethod
-    def update_user_settings(user_id: str, updates: Dict) -> Dict:
+    async def update_user_settings(user_id: str, updates: Dict) -> Dict:
         """
         Actualiza las configuraciones de un usuario.
         
@@ -61,16 +61,16 @@ class UserSettingsMongoService:
             Configuraciones actualizadas
         """
         # Asegurar que existen las configuraciones
-        existing = UserSettingsMongoService.get_user_settings(user_id)
+        existing = await UserSettingsMongoService.get_user_settings(user_id)
         
         # Preparar actualizaciones
         updates["updatedAt"] = datetime.now()
         
         # Actualizar en MongoDB
-        sync_user_settings_collection.update_one(
+        await user_settings_collection.update_one(
             {"userId": user_id},
             {"$set": updates}
         )
         
         # Obtener el documento actualizado
-        return sync_user_settings_collection.find_one({"userId": user_id})
\ No newline at end of file
+        return await user_settings_collection.find_one({"userId": user_id})
\ No newline at end of file
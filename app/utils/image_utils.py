@@ -1,5 +1,7 @@
 import os
 import base64
+import shutil
+import time
 from PIL import Image
 from typing import Tuple, Optional
 import io
@@ -28,6 +30,71 @@ def convert_image_to_base64(image_path: str) -> Optional[str]:
         logger.error(f"Error converting image to base64: {str(e)}")
         return None
 
+def link_or_copy(src_path: str, dst_path: str) -> None:
+    """
+    Crea dst_path con el contenido de src_path: un enlace duro (sin copiar datos) o,
+    si el sistema de archivos no lo permite, una copia.
+    
+    Args:
+        src_path: Ruta del archivo original
+        dst_path: Ruta del nuevo archivo
+    """
+    try:
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+def prune_cache_folder(folder: str, max_bytes: int, max_age: Optional[float] = None) -> int:
+    """
+    Limita una carpeta de caché de imágenes: borra los PNG con más de max_age segundos y,
+    si aun así se supera max_bytes, los más antiguos (por fecha de modificación) hasta
+    quedar por debajo. Los temporales (.tmp) de escrituras en curso no se tocan.
+    
+    Args:
+        folder: Carpeta de la caché
+        max_bytes: Tamaño total máximo de la caché
+        max_age: Antigüedad máxima de un archivo en segundos (None = sin límite)
+        
+    Returns:
+        Número de archivos eliminados
+    """
+    now = time.time()
+    entries = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if not entry.name.endswith(".png"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    except FileNotFoundError:
+        return 0
+    
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for mtime, size, path in entries:
+        expired = max_age is not None and now - mtime > max_age
+        if not expired and total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            # Otro proceso ya lo ha borrado
+            pass
+        except OSError as e:
+            logger.warning(f"Could not evict cached file {path}: {str(e)}")
+            continue
+        total -= size
+    
+    if removed:
+        logger.info(f"Evicted {removed} files from cache folder {folder}")
+    return removed
+
 def get_image_dimensions(image_path: str) -> Optional[Tuple[int, int]]:
     """
     Obtiene las dimensiones de una imagen.